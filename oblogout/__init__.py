@@ -31,305 +31,342 @@
 
 import os
 import sys
-import configparser
-import io
 import logging
-import gettext
 import string
-
-import gi
-gi.require_version('Gtk', '3.0')
-
-try:
-    from gi.repository import Gtk
-    from gi.repository import Gdk
-    from gi.repository import GdkPixbuf
-    # from gi.repository import GdkX11
-except:
-    print("pyGTK missing, install python-gobject")
-    sys.exit()
-
-try:
-    import cairo
-except:
-    print("Cairo modules missing, install python-cairo")
-
-try:
-    from PIL import Image, ImageFilter
-except:
-    print("PIL missing, install python-imaging")
-    sys.exit()
+import threading
+
+from .timing import measure, mark, stamp, memory_usage, trace_memory, untrace_memory, flush as flush_trace
+from . import i18n
+from .i18n import _
+from .config import VALID_BUTTONS, load_config
+
+# Imported before --trace is parsed, so recorded whether tracing is on or not
+stamp("import oblogout")
+
+# GTK and cairo are only imported once a window is built, so that importing
+# the package (oblogout --show, oblogout.daemon) stays cheap.
+Gtk = None
+Gdk = None
+GLib = None
+cairo = None
+
+def load_toolkit():
+    """ Import GTK and cairo into the module namespace """
+
+    global Gtk, Gdk, GLib, cairo
+
+    if Gtk is not None:
+        return
+
+    with measure("import gi.repository.Gtk"):
+        import gi
+        gi.require_version('Gtk', '3.0')
+
+        try:
+            from gi.repository import Gtk
+            from gi.repository import Gdk
+            from gi.repository import GLib
+            # from gi.repository import GdkX11
+        except:
+            print("pyGTK missing, install python-gobject")
+            sys.exit()
+
+    with measure("import cairo"):
+        try:
+            import cairo
+        except:
+            print("Cairo modules missing, install python-cairo")
 
 class OpenboxLogout():
 
-    cmd_shutdown = "shutdown -h now"
-    cmd_restart = "reboot"
-    cmd_suspend = "pmi action suspend"
-    cmd_hibernate = "pmi action hibernate"
-    cmd_safesuspend = ""
-    cmd_lock = "gnome-screensaver-command -l"
-    cmd_switch = "gdm-control --switch-user"
-    cmd_logout = "openbox --exit"
-
-    def __init__(self, config=None, local=None):
+    def __init__(self, config=None, local=None, daemon=None):
 
         if local:
             self.local_mode = True
         else:
             self.local_mode = False
 
-        # Start logger and gettext/i18n
-        self.logger = logging.getLogger(self.__class__.__name__)
-
-        if self.local_mode:
-            gettext.install('oblogout', 'mo')
+        # In daemon mode the window is kept alive and hidden between uses
+        if daemon:
+            self.daemon_mode = True
         else:
-            gettext.install('oblogout', '%s/share/locale' % sys.prefix)
+            self.daemon_mode = False
+
+        load_toolkit()
+
+        # Start logger, translations are only loaded on the first lookup
+        self.logger = logging.getLogger(self.__class__.__name__)
+        i18n.setup(self.local_mode)
 
         # Load configuration file
-        self.load_config(config)
+        with measure("load_config"):
+            self.load_config(config)
 
         # Start the window
-        self.__init_window()
+        self.drawn = False
+        with measure("init_window"):
+            self.__init_window()
 
     def __init_window(self):
         # Start pyGTK setup
         self.window = Gtk.Window()
         self.window.set_title(_("Openbox Logout"))
 
-        self.window.connect("destroy", self.quit)
+        self.window.connect("destroy", self.quit, True)
+        self.window.connect("delete-event", self.on_delete)
         self.window.connect("key-press-event", self.on_keypress)
         self.window.connect("window-state-event", self.on_window_state_change)
 
+        # Link in Cairo rendering events
+        from .render import Background
+        self.background = Background(self.bgcolor, self.opacity)
+        self.window.connect('draw', self.on_expose)
+
         if not self.window.is_composited():
             self.logger.debug("No compositing, enabling rendered effects")
             # Window isn't composited, enable rendered effects
             self.rendered_effects = True
         else:
-            # Link in Cairo rendering events
-            self.window.connect('draw', self.on_expose)
             self.window.connect('screen-changed', self.on_screen_changed)
             self.on_screen_changed(self.window)
             self.rendered_effects = False
 
         self.window.set_size_request(620,200)
-        bgcolor = Gdk.RGBA()
-        Gdk.RGBA.parse(bgcolor, "black")
-        self.window.modify_bg(Gtk.StateFlags.NORMAL, bgcolor.to_color())
+        from . import dialog
+        self.window.get_style_context().add_class("oblogout")
+        with measure("load styles"):
+            dialog.add_styles(self.window.get_screen(), self.img_path)
 
         self.window.set_decorated(False)
         self.window.set_position(Gtk.WindowPosition.CENTER)
 
         # Check monitor
-        screen  = Gdk.Screen.get_default()
-        if screen.get_n_monitors() < self.monitor:
-           self.monitor = screen.get_n_monitors()
-
-        geometry = screen.get_monitor_geometry(self.monitor)
-        width    = geometry.width
-        height   = geometry.height
+        self.geometry, others, self.capture = self.__monitor_layout()
 
-        x = geometry.x
-        y = geometry.y
-
-        # Create the main panel box
-        self.mainpanel = Gtk.HBox()
-
-        # Create the button box
-        self.buttonpanel = Gtk.HButtonBox()
-        self.buttonpanel.set_spacing(10)
-
-        # Pack in the button box into the panel box, with two padder boxes
-        self.mainpanel.pack_start(Gtk.VBox(), expand=True, fill=True, padding=0)
-        self.mainpanel.pack_start(self.buttonpanel, expand=False, fill=False, padding=0)
-        self.mainpanel.pack_start(Gtk.VBox(), expand=True, fill=True, padding=0)
+        # Create the main panel box, with the button box centred in it
+        builder = dialog.build_panel(self.button_list)
+        self.mainpanel = builder.get_object("mainpanel")
+        self.buttonpanel = builder.get_object("buttonpanel")
 
         # Add the main panel to the window
         self.window.add(self.mainpanel)
 
-        for button in self.button_list:
-            self.__add_button(button, self.buttonpanel)
-
-        if self.rendered_effects == True:
-            self.logger.debug("Stepping though render path")
-            w = Gdk.get_default_root_window()
-            pb = Gdk.pixbuf_get_from_window(w,x,y,width,height)
-
-            self.logger.debug("Rendering Fade")
-            # Convert Pixbuf to PIL Image
-            wh = (pb.get_width(),pb.get_height())
-            pilimg = Image.frombytes("RGB", wh, pb.get_pixels())
-
-            pilimg = pilimg.point(lambda p: ((p * self.opacity) // 255 ))
+        from .iconcache import IconCache
+        self.icons = IconCache(self.button_theme, self.window.get_scale_factor())
 
-            # "Convert" the PIL to Pixbuf via PixbufLoader
-            buf = io.BytesIO()
-            pilimg.save(buf, "ppm")
-            del pilimg
-            loader = GdkPixbuf.PixbufLoader.new_with_type("pnm")
-            loader.write(buf.getvalue())
-            pixbuf = loader.get_pixbuf()
+        self.buttons = {}
+        for button in self.button_list:
+            self.__add_button(button, builder)
 
-            # Cleanup IO
-            buf.close()
-            loader.close()
-
-            # width, height = pixmap.get_size()
-        else:
-            pixbuf = None
+        self.probe_backend()
 
         self.window.set_app_paintable(True)
-        self.window.resize(width, height)
+        self.window.resize(self.geometry.width, self.geometry.height)
         self.window.realize()
+        self.window.move(self.geometry.x, self.geometry.y)
 
-        if pixbuf:
-            self.window.connect('draw', self.on_expose, pixbuf)
-        self.window.move(x,y)
-
-    def load_config(self, config):
-        """ Load the configuration file and parse entries, when encountering a issue
-            change safe defaults """
-
-        self.parser = configparser.ConfigParser()
-        self.parser.read(config)
-
-        # Set some safe defaults
-        self.opacity = 50
-        self.button_theme = "default"
-        self.bgcolor = Gdk.RGBA()
-        Gdk.RGBA.parse(self.bgcolor, "black")
-        self.monitor = 0
-        self.lock_on_hibernate = True
-        self.lock_on_suspend = True
-        blist = ""
-
-        # Check if we're using HAL, and init it as required.
-        if self.parser.has_section("settings"):
+        self.overlays = []
+        for geometry in others:
+            self.__add_overlay(geometry)
 
-            if self.parser.has_option("settings","backend"):
-               self.backend = self.parser.get("settings","backend")
-            else:
-               self.backend = ""
-
-            if self.parser.has_option("settings", "monitor"):
-               self.monitor = self.parser.getint("settings", "monitor")
-
-            if self.parser.has_option("settings", "disable_lock_on"):
-                lock_on_settings = [_.strip() for _ in self.parser.get("settings", "disable_lock_on").split(",")]
-                self.lock_on_hibernate = "hibernate" not in lock_on_settings
-                self.lock_on_suspend = "suspend" not in lock_on_settings
-
-        if self.backend == "HAL" or self.backend == "ConsoleKit":
-            from .dbushandler import DbusController
-            self.dbus = DbusController(self.backend)
-            if self.dbus.check() == False:
-               del self.dbus
-               self.backend = ""
+        self.background.rendered = self.rendered_effects
+        self.background_generation = 0
+        if self.rendered_effects == True:
+            with measure("render background"):
+                self.__render_background()
+
+    def __monitor_layout(self):
+        """ Returns the geometry of the monitor showing the buttons, the geometries of
+            the other monitors to cover and the area of the screen to capture """
+
+        display = Gdk.Display.get_default()
+        n_monitors = display.get_n_monitors()
+
+        if self.monitor != "all":
+            if not 0 <= self.monitor < n_monitors:
+                self.logger.warning("Monitor %s not found, using monitor %d" % (self.monitor, n_monitors - 1))
+                self.monitor = n_monitors - 1
+            geometry = display.get_monitor(self.monitor).get_geometry()
+            return geometry, [], geometry
+
+        # Buttons go on the monitor with the pointer, or the primary one
+        screen, x, y = display.get_default_seat().get_pointer().get_position()
+        panel = display.get_monitor_at_point(x, y) or display.get_primary_monitor() or display.get_monitor(0)
+
+        geometry = panel.get_geometry()
+        others = []
+        capture = Gdk.Rectangle()
+        capture.x, capture.y, capture.width, capture.height = geometry.x, geometry.y, geometry.width, geometry.height
+
+        for i in range(n_monitors):
+            monitor = display.get_monitor(i)
+            if monitor == panel:
+                continue
+            other = monitor.get_geometry()
+            others.append(other)
+            capture = capture.union(other)
+
+        return geometry, others, capture
+
+    def __add_overlay(self, geometry):
+        """ Cover another monitor with a plain window showing its part of the background """
+
+        overlay = Gtk.Window()
+        overlay.set_decorated(False)
+        overlay.set_skip_taskbar_hint(True)
+        overlay.set_skip_pager_hint(True)
+        overlay.set_app_paintable(True)
+        overlay.connect("key-press-event", self.on_keypress)
+        overlay.connect("draw", self.on_overlay_expose, geometry)
+        if not self.rendered_effects:
+            overlay.connect('screen-changed', self.on_screen_changed)
+            self.on_screen_changed(overlay)
+
+        overlay.resize(geometry.width, geometry.height)
+        overlay.realize()
+        overlay.move(geometry.x, geometry.y)
+        overlay.geometry = geometry
+        self.overlays.append(overlay)
+
+    def __show_overlays(self):
+        for overlay in self.overlays:
+            overlay.show()
+
+    def __hide(self):
+        self.window.hide()
+        for overlay in self.overlays:
+            overlay.hide()
+
+    def __render_background(self):
+        """ Grab the monitors from the root window and fade them, used as background when not composited """
+
+        self.logger.debug("Stepping though render path")
+        # Python allocations are only traced when profiling, the RSS is free
+        report = trace_memory() or self.logger.isEnabledFor(logging.DEBUG)
+        before = memory_usage(reset_peak=True) if report else None
+
+        self.background.clear()
+        g = self.capture
+        from .capture import grab
+        from .effects import apply_effects
+
+        self.background_generation += 1
+        if self.bounded_memory:
+            # Grabbed and faded a strip at a time straight into the window's
+            # surface, so it can't be deferred. Blur reads across strip edges
+            self.logger.debug("Rendering Fade in strips")
+            effects = [effect for effect in self.effects if effect != 'blur']
+            with measure("render strips"):
+                self.background.render_strips(self.window.get_window(), g, grab,
+                                              lambda pb: apply_effects(pb, effects, self.opacity, 0, False))
         else:
-            self.backend = ""
-
-        # Check the looks section and load the config as required
-        if self.parser.has_section("looks"):
-
-            if self.parser.has_option("looks", "opacity"):
-                self.opacity = self.parser.getint("looks", "opacity")
-
-            if self.parser.has_option("looks","buttontheme"):
-                self.button_theme = self.parser.get("looks", "buttontheme")
-
-            if self.parser.has_option("looks", "bgcolor"):
-                try:
-                    Gdk.RGBA.parse(self.bgcolor, self.parser.get("looks", "bgcolor"))
-                except:
-                    self.logger.warning(_("Color %s is not a valid color, defaulting to black") % self.parser.get("looks", "bgcolor"))
-                    Gdk.RGBA.parse(self.bgcolor, "black")
-
-            if self.parser.has_option("looks", "opacity"):
-                blist = self.parser.get("looks", "buttons")
-
-        # Parse shortcuts section and load them into a array for later reference.
-        if self.parser.has_section("shortcuts"):
-            self.shortcut_keys = self.parser.items("shortcuts")
-            self.logger.debug("Shortcut Options: %s" % self.shortcut_keys)
+            with measure("capture"):
+                pb = grab(g.x, g.y, g.width, g.height)
 
+            # The grab has to be done before the window is mapped, only the fade can wait
+            if self.progressive:
+                self.logger.debug("Fading in the background")
+                worker = threading.Thread(target=self.__fade_worker, args=(pb, self.background_generation, before))
+                worker.daemon = True
+                worker.start()
+                return
 
-        # Parse in commands section of the configuration file. Check for valid keys and set the attribs on self
-        if self.parser.has_section("commands"):
-            for key in self.parser.items("commands"):
-                self.logger.debug("Setting cmd_%s as %s" % (key[0], key[1]))
-                if key[0] in ['logout', 'restart', 'shutdown', 'suspend', 'hibernate', 'safesuspend', 'lock', 'switch']:
-                    if key[0]: setattr(self, "cmd_" + key[0], key[1])
+            self.logger.debug("Rendering Fade")
+            self.background.set_pixbuf(apply_effects(pb, self.effects, self.opacity, self.effect_budget, False),
+                                       self.window.get_window())
+            del pb
+
+        if before is not None:
+            self.__report_memory(before)
+
+    def __report_memory(self, before):
+        after = memory_usage()
+        if 'traced_kb' in after:
+            untrace_memory()
+        mark("background memory", **after)
+        line = "Background memory: RSS %d KB (%+d KB), peak RSS %d KB (%+d KB)" % (
+            after['rss_kb'], after['rss_kb'] - before['rss_kb'],
+            after['peak_rss_kb'], after['peak_rss_kb'] - before['peak_rss_kb'])
+        if 'traced_peak_kb' in after:
+            line += ", Python peak %d KB" % after['traced_peak_kb']
+        self.logger.info(line)
+
+    def __fade_worker(self, pb, generation, before):
+        from .effects import apply_effects
+        with measure("fade worker"):
+            # The conversion and the dim are done here too, the main thread
+            # is only left to copy the finished image
+            image = self.background.dimmed_image(
+                apply_effects(pb, self.effects, self.opacity, self.effect_budget, False))
+        del pb
+        GLib.idle_add(self.__on_background_ready, image, generation, before)
+
+    def __on_background_ready(self, image, generation, before=None):
+        # A newer grab was started since, e.g. the daemon showed the window again,
+        # it reports the memory and stops the allocation tracing
+        if generation != self.background_generation:
+            image.finish()
+            return False
+
+        mark("background ready")
+        with measure("copy background"):
+            self.background.set_image(image, self.window.get_window())
+        if before is not None:
+            self.__report_memory(before)
+        self.window.queue_draw()
+        for overlay in self.overlays:
+            overlay.queue_draw()
+        return False
 
-        # Load theme information from local directory if local mode is set
-        if self.local_mode:
-            self.theme_prefix = "./data/themes"
-        else:
-            self.theme_prefix = "%s/share/themes" % sys.prefix
+    def load_config(self, config):
+        """ Load the resolved configuration and apply the runtime checks that can't
+            be cached: colour parsing and the backend abilities """
 
-        self.img_path = "%s/%s/oblogout" % (self.theme_prefix, self.button_theme)
+        settings = load_config(config, self.local_mode)
 
-        if os.path.exists("%s/.themes/%s/oblogout" % (os.environ['HOME'], self.button_theme)):
-            # Found a valid theme folder in the userdir, use that
-            self.img_path = "%s/.themes/%s/oblogout" % (os.environ['HOME'], self.button_theme)
-            self.logger.info("Using user theme at %s" % self.img_path)
-        else:
-            if not os.path.exists("%s/%s/oblogout" % (self.theme_prefix, self.button_theme)):
-                self.logger.warning("Button theme %s not found, reverting to default" % self.button_theme)
-                self.button_theme = 'foom'
+        self.monitor = settings['monitor']
+        self.opacity = settings['opacity']
+        self.progressive = settings['progressive']
+        self.effects = settings['effects']
+        self.effect_budget = settings['effect_budget']
+        self.bounded_memory = settings['bounded_memory']
+        self.button_theme = settings['button_theme']
+        self.img_path = os.path.expanduser(settings['img_path'])
+        self.icon_files = settings['icons']
+        self.shortcut_keys = settings['shortcuts']
 
+        from .shortcuts import ShortcutMap
+        self.shortcuts = ShortcutMap(self.shortcut_keys)
 
-        # Parse button list from config file.
-        validbuttons = ['cancel', 'logout', 'restart', 'shutdown', 'suspend', 'hibernate', 'safesuspend', 'lock', 'switch']
-        buttonname = [_('cancel'), _('logout'), _('restart'), _('shutdown'), _('suspend'), _('hibernate'), _('safesuspend'), _('lock'), _('switch')]
-
-        if not blist:
-            L = validbuttons
-        elif blist == "default":
-            L = validbuttons
-        else:
-            L = [str.strip(button) for button in blist.split(",")]
+        self.bgcolor = Gdk.RGBA()
+        if not Gdk.RGBA.parse(self.bgcolor, settings['bgcolor']):
+            self.logger.warning(_("Color %s is not a valid color, defaulting to black") % settings['bgcolor'])
+            Gdk.RGBA.parse(self.bgcolor, "black")
 
-        # Validate the button L
-        for button in L:
-            if not button in validbuttons:
-                self.logger.warning(_("Button %s is not a valid button name, removing") % button)
-                L.remove(button)
-            else:
-                if self.backend:
-                    if not self.dbus.check_ability(button):
-                        self.logger.warning(_("Can't %s, disabling button" % button))
-                        L.remove(button)
+        # The backend is only probed once the window exists, see probe_backend()
+        from .actions import Actions
+        self.actions = Actions(settings)
 
+        L = settings['buttons']
         if len(L) == 0:
             self.logger.warning(_("No valid buttons found, resetting to defaults"))
-            self.button_list = validbuttons
+            self.button_list = list(VALID_BUTTONS)
         else:
             self.logger.debug("Validated Button List: %s" % L)
             self.button_list = L
 
 
-    def on_expose(self, widget, event, *args):
+    def on_expose(self, widget, cr, *args):
 
-        cr = widget.get_window().cairo_create()
+        if not self.drawn:
+            self.drawn = True
+            mark("first draw")
 
-        if hasattr(self, "supports_alpha") and self.supports_alpha == True:
-            cr.set_source_rgba(1.0, 1.0, 1.0, 0.0) # Transparent
-        else:
-            cr.set_source_rgb(1.0, 1.0, 1.0) # Opaque white
-
-        # Draw the background
-        cr.set_operator(cairo.OPERATOR_SOURCE)
-        cr.paint()
-
-        (width, height) = widget.get_size()
-        if args: # pixbuf
-            Gdk.cairo_set_source_pixbuf(cr, args[0], 0, 0)
-        else:
-            cr.set_source_rgba(self.bgcolor.red, self.bgcolor.green, self.bgcolor.blue, float(self.opacity)/100)
+        self.background.draw(cr, self.geometry.x - self.capture.x, self.geometry.y - self.capture.y)
+        return False
 
-        cr.rectangle(0, 0, width, height)
-        cr.fill()
-        cr.stroke()
+    def on_overlay_expose(self, widget, cr, geometry):
+        self.background.draw(cr, geometry.x - self.capture.x, geometry.y - self.capture.y)
         return False
 
     def on_screen_changed(self, widget, old_screen=None):
@@ -347,6 +384,55 @@ class OpenboxLogout():
 
         # Now we have a colormap appropriate for the screen, use it
         widget.set_visual(colormap)
+        self.background.supports_alpha = self.supports_alpha
+
+    def probe_backend(self):
+        """ Ask the backend which actions it can perform, buttons are disabled as the
+            answers come in. A backend found unavailable stays disabled and is asked
+            again on the next show, it may have been starting or restarting """
+
+        if self.actions.dbus is None:
+            return
+
+        from .dbushandler import ABILITY_TTL
+
+        probe = {'unavailable': False}
+
+        def on_unavailable():
+            probe['unavailable'] = True
+            self.on_backend_unavailable()
+
+        def on_finished():
+            if probe['unavailable']:
+                return
+            if not self.actions.backend:
+                self.logger.info("Backend %s is available again" % self.actions.configured_backend)
+                self.actions.enable_backend()
+            # Connect the action proxies once the backend has answered
+            self.actions.dbus.warm_up(self.button_list)
+
+        # The cached answer is what disabled it, ask the services themselves
+        ttl = ABILITY_TTL if self.actions.backend else 0
+        self.actions.dbus.probe(self.button_list, self.on_ability, on_unavailable, ttl, on_finished)
+
+    def on_ability(self, action, able):
+        if not able:
+            self.logger.warning(_("Can't %s, disabling button") % action)
+        self.buttons[action].set_sensitive(able)
+
+    def on_backend_unavailable(self):
+        if self.actions.backend:
+            self.logger.warning("Backend %s is not available, using commands" % self.actions.backend)
+        self.actions.disable_backend()
+        for button in self.buttons.values():
+            button.set_sensitive(True)
+
+    def on_delete(self, widget, event, *args):
+        # Closing the window only hides it while running as a daemon
+        if self.daemon_mode:
+            self.quit()
+            return True
+        return False
 
     def on_window_state_change(self, widget, event, *args):
         if event.new_window_state & Gdk.WindowState.FULLSCREEN:
@@ -354,100 +440,122 @@ class OpenboxLogout():
         else:
             self.window_in_fullscreen = False
 
-    def __add_button(self, name, widget):
-        """ Add a button to the panel """
+    def __add_button(self, name, builder):
+        """ Set up the button built for name in the panel """
 
-        box = Gtk.VBox()
+        from .dialog import button_id
 
-        image = Gtk.Image()
-        if os.path.exists("%s/%s.svg" % (self.img_path, name)):
-            image.set_from_file("%s/%s.svg" % (self.img_path, name))
+        image = builder.get_object(button_id("image", name))
+        entry = self.icon_files.get(name)
+        if entry is None:
+            self.logger.error("Theme %s has no icon for %s in %s" % (self.button_theme, name, self.img_path))
+            pixbuf = None
         else:
-            image.set_from_file("%s/%s.png" % (self.img_path, name))
-        image.show()
-
-        button = Gtk.Button()
-        button.set_relief(Gtk.ReliefStyle.NONE)
-        button.modify_bg(Gtk.StateFlags.PRELIGHT, Gdk.color_parse("black"))
-        button.set_focus_on_click(False)
-        button.set_border_width(0)
-        button.set_property('can-focus', False)
-        button.add(image)
-        button.show()
-        box.pack_start(button, expand=False, fill=False, padding=0)
-        button.connect("clicked", self.click_button, name)
+            icon = os.path.expanduser(entry['path'])
+            try:
+                pixbuf = self.icons.load(icon, entry['mtime_ns'])
+            except (OSError, GLib.Error) as ex:
+                self.logger.error("Unable to load icon %s: %s, run oblogout --index-themes if the theme changed"
+                                  % (icon, ex))
+                pixbuf = None
+
+        if pixbuf is not None:
+            if self.icons.scale > 1:
+                # Icons are rasterized for the scale factor, draw them 1:1 in device pixels
+                image.set_from_surface(Gdk.cairo_surface_create_from_pixbuf(pixbuf, self.icons.scale, None))
+            else:
+                image.set_from_pixbuf(pixbuf)
 
-        label = Gtk.Label(_(name))
-        label.modify_fg(Gtk.StateFlags.NORMAL, Gdk.color_parse("white"))
-        box.pack_end(label, expand=False, fill=False, padding=0)
+        button = builder.get_object(button_id("button", name))
+        button.get_style_context().add_class(name)
+        button.connect("clicked", self.click_button, name)
+        self.buttons[name] = button
 
-        widget.pack_start(box, expand=False, fill=False, padding=0)
+        builder.get_object(button_id("label", name)).set_text(_(name))
 
     def click_button(self, widget, data=None):
-        if (data == 'logout'):
-            self.__exec_cmd(self.cmd_logout)
+        mark("click_button", action=data)
 
-        elif (data == 'restart'):
-            if self.backend:
-                self.dbus.restart()
-            else:
-                self.__exec_cmd(self.cmd_restart)
+        # Shortcuts can still name a button the backend disabled
+        if data in self.buttons and not self.buttons[data].get_sensitive():
+            return
 
-        elif (data == 'shutdown'):
-            if self.backend:
-                self.dbus.shutdown()
-            else:
-                self.__exec_cmd(self.cmd_shutdown)
+        # Hide straight away, the commands run in the background and the
+        # dialog quits once they no longer need the main loop
+        self.__hide()
 
-        elif (data == 'suspend'):
-            self.window.hide()
-            if self.lock_on_suspend:
-                self.__exec_cmd(self.cmd_lock)
-            if self.backend:
-                self.dbus.suspend()
-
-            else:
-                self.__exec_cmd(self.cmd_suspend)
-
-        elif (data == 'hibernate'):
-            self.window.hide()
-            if self.lock_on_hibernate:
-                self.__exec_cmd(self.cmd_lock)
-            if self.backend:
-                self.dbus.hibernate()
-            else:
-                self.__exec_cmd(self.cmd_hibernate)
-
-        elif (data == 'safesuspend'):
-            self.window.hide()
-
-            if self.backend:
-                self.dbus.safesuspend()
-            else:
-                self.__exec_cmd(self.cmd_safesuspend)
+        self.executor = self.actions.run(data, on_idle=self.quit)
 
-        elif (data == 'lock'):
-            self.__exec_cmd(self.cmd_lock)
+    def on_keypress(self, widget=None, event=None, data=None):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Keypress: %s/%s" % (event.keyval, Gdk.keyval_name(event.keyval)))
+
+        action = self.shortcuts.press(event.keyval, event.state, event.time)
+        if action:
+            self.logger.debug("Matched %s" % action)
+            self.click_button(widget, action)
+
+    def quit(self, widget=None, force=None):
+        mark("quit")
+        if self.daemon_mode and not force:
+            self.__hide()
+            # A daemon doesn't exit, write the trace after each use
+            flush_trace()
+        else:
+            Gtk.main_quit()
+
+    def show(self):
+        """ Reset the pre-built window and display it again """
+
+        if self.window.get_visible():
+            self.window.present()
+            return
+
+        mark("show")
+        self.drawn = False
+
+        # Monitors may have been plugged, or the pointer moved to another one
+        geometry, others, capture = self.__monitor_layout()
+        rect = lambda r: (r.x, r.y, r.width, r.height)
+        if rect(geometry) != rect(self.geometry) or list(map(rect, others)) != [rect(o.geometry) for o in self.overlays]:
+            self.geometry, self.capture = geometry, capture
+            self.window.resize(geometry.width, geometry.height)
+            for overlay in self.overlays:
+                overlay.destroy()
+            self.overlays = []
+            for other in others:
+                self.__add_overlay(other)
 
-        elif (data == 'switch'):
-            self.__exec_cmd(self.cmd_switch)
+        if self.rendered_effects == True:
+            # The screen changed since the last capture, grab it again
+            self.__render_background()
 
-        self.quit()
+        self.probe_backend()
 
-    def on_keypress(self, widget=None, event=None, data=None):
-        self.logger.debug("Keypress: %s/%s" % (event.keyval, Gdk.keyval_name(event.keyval)))
-        for key in self.shortcut_keys:
-            if event.keyval == Gdk.keyval_to_lower(Gdk.keyval_from_name(key[1])):
-                self.logger.debug("Matched %s" % key[0])
-                self.click_button(widget, key[0])
+        self.window.move(self.geometry.x, self.geometry.y)
+        self.__show_overlays()
+        self.window.show_all()
+        self.window.present()
 
-    def __exec_cmd(self, cmdline):
-        self.logger.debug("Executing command: %s", cmdline)
-        os.system(cmdline)
+    def run_logout(self):
+        """ Run the dialog until it quits, returns the exit status """
+
+        if self.daemon_mode:
+            from .daemon import LogoutDaemon
+            self.daemon = LogoutDaemon(self)
+            try:
+                self.daemon.start()
+            except RuntimeError as ex:
+                self.logger.error("Unable to start the daemon: %s" % ex)
+                return 1
+        else:
+            self.__show_overlays()
+            self.window.show_all()
 
-    def quit(self, widget=None, data=None):
-        Gtk.main_quit()
+        try:
+            Gtk.main()
+        finally:
+            if self.daemon_mode:
+                self.daemon.stop()
 
-    def run_logout(self):
-        self.window.show_all()
-        Gtk.main()
+        return 0
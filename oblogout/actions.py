@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# What each button does, without any GUI: the dialog and `oblogout --action`
+# both go through Actions, which only needs GLib for the executor and dbus
+# for a backend.
+
+import logging
+
+from .timing import measure, mark
+from .config import BACKENDS, VALID_COMMANDS
+from .executor import ActionExecutor, FAILED
+
+class Actions(object):
+
+    """ Actions carries out a button following the configuration: the backend,
+        the [commands] overrides, disable_lock_on and the timeouts """
+
+    cmd_shutdown = "shutdown -h now"
+    cmd_restart = "reboot"
+    cmd_suspend = "pmi action suspend"
+    cmd_hibernate = "pmi action hibernate"
+    cmd_safesuspend = ""
+    cmd_lock = "gnome-screensaver-command -l"
+    cmd_switch = "gdm-control --switch-user"
+    cmd_logout = "openbox --exit"
+
+    def __init__(self, settings):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.backend = settings['backend']
+        self.lock_on_hibernate = settings['lock_on_hibernate']
+        self.lock_on_suspend = settings['lock_on_suspend']
+        self.timeouts = settings['timeouts']
+
+        for key, value in settings['commands'].items():
+            setattr(self, "cmd_" + key, value)
+
+        # Check if we're using HAL, and init it as required
+        self.dbus = None
+        if self.backend in BACKENDS:
+            with measure("import dbus"):
+                from .dbushandler import DbusController
+            self.dbus = DbusController(self.backend)
+        else:
+            self.backend = ""
+        self.configured_backend = self.backend
+
+    def disable_backend(self):
+        """ Use the commands from now on, e.g. when the backend service is missing """
+        self.backend = ""
+
+    def enable_backend(self):
+        """ Go back to the configured backend once its services answer again """
+        self.backend = self.configured_backend
+
+    def lock_action(self):
+        """ The lock command, logind locks the session when none is configured """
+        if not self.cmd_lock and self.backend == "logind":
+            return self.dbus.lock
+        return self.cmd_lock
+
+    def __exec_cmd(self, executor, name, action, after=None):
+        """ Queue a command line or backend call on the action executor """
+        mark("exec_cmd", step=name)
+        executor.add(name, action, self.timeouts.get(name), after)
+
+    def queue(self, executor, data):
+        """ Queue the steps of action data on executor """
+
+        if (data == 'logout'):
+            self.__exec_cmd(executor, 'logout', self.cmd_logout)
+
+        elif (data == 'restart'):
+            if self.backend:
+                self.__exec_cmd(executor, 'restart', self.dbus.restart)
+            else:
+                self.__exec_cmd(executor, 'restart', self.cmd_restart)
+
+        elif (data == 'shutdown'):
+            if self.backend:
+                self.__exec_cmd(executor, 'shutdown', self.dbus.shutdown)
+            else:
+                self.__exec_cmd(executor, 'shutdown', self.cmd_shutdown)
+
+        elif (data == 'suspend'):
+            if self.lock_on_suspend:
+                self.__exec_cmd(executor, 'lock', self.lock_action())
+            # The lock must have started before the system goes to sleep
+            if self.backend:
+                self.__exec_cmd(executor, 'suspend', self.dbus.suspend, after='lock')
+            else:
+                self.__exec_cmd(executor, 'suspend', self.cmd_suspend, after='lock')
+
+        elif (data == 'hibernate'):
+            if self.lock_on_hibernate:
+                self.__exec_cmd(executor, 'lock', self.lock_action())
+            if self.backend:
+                self.__exec_cmd(executor, 'hibernate', self.dbus.hibernate, after='lock')
+            else:
+                self.__exec_cmd(executor, 'hibernate', self.cmd_hibernate, after='lock')
+
+        elif (data == 'safesuspend'):
+            if self.backend:
+                self.__exec_cmd(executor, 'safesuspend', self.dbus.safesuspend)
+            else:
+                self.__exec_cmd(executor, 'safesuspend', self.cmd_safesuspend)
+
+        elif (data == 'lock'):
+            self.__exec_cmd(executor, 'lock', self.lock_action())
+
+        elif (data == 'switch'):
+            self.__exec_cmd(executor, 'switch', self.cmd_switch)
+
+    def run(self, data, on_idle=None, wait=False):
+        """ Start action data, on_idle is called once nothing needs the main loop any
+            more, or once the commands have exited as well with wait """
+
+        executor = ActionExecutor(on_idle=on_idle, wait_children=wait)
+        self.queue(executor, data)
+        executor.start()
+        return executor
+
+def run_headless(settings, data):
+    """ Carry out action data without a display, for oblogout --action. The
+        backend is checked first as the dialog does, the [commands] entry is
+        used when it is missing. Returns the exit status, 1 if there is nothing
+        to run, a step failed or a command exited with an error """
+
+    from gi.repository import GLib
+
+    logger = logging.getLogger("Actions")
+    if data not in VALID_COMMANDS:
+        logger.error("Unknown action %s, valid actions: %s" % (data, ", ".join(VALID_COMMANDS)))
+        return 2
+
+    loop = GLib.MainLoop()
+    actions = Actions(settings)
+
+    if actions.backend:
+        probe = {'finished': False, 'able': True}
+
+        def on_ability(action, able):
+            probe['able'] = able
+
+        def on_unavailable():
+            logger.warning("Backend %s is not available, using commands" % actions.backend)
+            actions.disable_backend()
+
+        def on_finished():
+            probe['finished'] = True
+            loop.quit()
+
+        actions.dbus.probe([data], on_ability, on_unavailable, on_finished=on_finished)
+        if not probe['finished']:
+            loop.run()
+        if actions.backend and not probe['able']:
+            logger.error("Backend %s can't %s" % (actions.backend, data))
+            return 1
+
+    executor = ActionExecutor(on_idle=loop.quit, wait_children=True)
+    actions.queue(executor, data)
+    # An empty command is skipped by the executor, which would report success
+    if not any(step.name == data for step in executor.queued):
+        logger.error("No command configured for %s" % data)
+        return 1
+
+    executor.start()
+    if not executor.idle():
+        loop.run()
+
+    return 1 if FAILED in executor.state.values() else 0
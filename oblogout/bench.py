@@ -0,0 +1,452 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Benchmark suite, run from the source tree with
+#
+#   python -m oblogout.bench [--output results.json] [--resolution 1920x1080]
+#                            [--repeat 5]
+#
+# Every display benchmark runs in its own Xvfb server, once without and once
+# with a compositor (xcompmgr or picom, skipped when neither is installed):
+#
+#   - cold and warm start-up to the first 'draw', in fresh processes, with
+#     an empty and then a populated cache directory
+#   - on_keypress to executor dispatch latency, commands are replaced by a
+#     stub executor which never runs anything
+#   - a full screen grab with each capture backend (MIT-SHM, cairo, Gdk)
+#   - building the button panel with every button, from the GtkBuilder
+#     template and with the former hand-written widget code
+#
+# plus the fade engines and background effects at several resolutions,
+# load_config on a large configuration and the D-Bus backends against the
+# stand-in services of oblogout.mockbus. Results are written as JSON to track
+# regressions.
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import tempfile
+import platform
+import subprocess
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(SOURCE_DIR, "data", "oblogout.conf")
+
+FADE_RESOLUTIONS = ((1920, 1080), (2560, 1440), (3840, 2160))
+
+def start_xvfb(width, height):
+    """ Start a private Xvfb server, returns (process, display) """
+
+    read_fd, write_fd = os.pipe()
+    xvfb = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-nolisten", "tcp",
+                             "-screen", "0", "%dx%dx24" % (width, height), "+extension", "Composite"],
+                            pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        display = f.readline().strip()
+
+    if not display:
+        xvfb.kill()
+        raise RuntimeError("Xvfb failed to start")
+    return xvfb, ":%s" % display
+
+def start_compositor(env):
+    for compositor in (["xcompmgr"], ["picom", "--backend", "xrender"]):
+        if shutil.which(compositor[0]):
+            process = subprocess.Popen(compositor, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Give it time to take the compositing manager selection
+            time.sleep(0.5)
+            return process
+    return None
+
+def run_child(name, env, *args):
+    """ Run a benchmark in a fresh interpreter, returns its JSON result and the wall time in ms """
+
+    start = time.monotonic()
+    output = subprocess.check_output([sys.executable, "-m", "oblogout.bench", "--child", name] + list(args),
+                                     env=env, cwd=SOURCE_DIR)
+    result = json.loads(output.decode().splitlines()[-1])
+    result['wall_ms'] = (time.monotonic() - start) * 1000
+    # Time from spawning the interpreter to the first draw
+    if 'first_draw' in result:
+        result['spawn_to_draw_ms'] = (result.pop('first_draw') - start) * 1000
+    return result
+
+def bench_display(composited, width, height, repeat):
+    xvfb, display = start_xvfb(width, height)
+    cache = tempfile.mkdtemp(prefix="oblogout-bench-")
+    env = dict(os.environ, DISPLAY=display, XDG_CACHE_HOME=cache,
+               PYTHONPATH=os.pathsep.join([SOURCE_DIR, os.environ.get("PYTHONPATH", "")]))
+    env.pop("OBLOGOUT_TRACE", None)
+    compositor = None
+
+    try:
+        if composited:
+            compositor = start_compositor(env)
+            if compositor is None:
+                return {'skipped': "no compositor found (xcompmgr, picom)"}
+
+        results = {'cold_startup': [], 'warm_startup': []}
+        for i in range(repeat):
+            shutil.rmtree(cache, ignore_errors=True)
+            results['cold_startup'].append(run_child("startup", env, CONFIG))
+            results['warm_startup'].append(run_child("startup", env, CONFIG))
+
+        results['dispatch'] = run_child("dispatch", env, CONFIG, str(repeat * 20))
+        results['capture'] = run_child("capture", env, str(repeat))
+        results['widgets'] = run_child("widgets", env, str(repeat * 20))
+        return results
+    finally:
+        if compositor is not None:
+            compositor.terminate()
+        xvfb.terminate()
+        xvfb.wait()
+        shutil.rmtree(cache, ignore_errors=True)
+
+def bench_config(repeat, entries=2000):
+    """ load_config on a large configuration, parsed and from its snapshot """
+
+    from . import config
+
+    tmp = tempfile.mkdtemp(prefix="oblogout-bench-")
+    old_cache = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = tmp
+
+    try:
+        path = os.path.join(tmp, "oblogout.conf")
+        with open(path, "w") as f:
+            f.write("[looks]\nbuttons = %s\n\n[shortcuts]\n" % ", ".join(config.VALID_BUTTONS * 20))
+            for i in range(entries):
+                f.write("shortcut%d = Ctrl+Alt+F%d\n" % (i, i % 12 + 1))
+            f.write("\n[commands]\n")
+            for i in range(entries):
+                f.write("command%d = /usr/bin/true --option %d\n" % (i, i))
+
+        parsed = []
+        cached = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            config.parse_config(path, True)
+            parsed.append((time.perf_counter() - start) * 1000)
+
+            config.load_config(path, True)
+            start = time.perf_counter()
+            config.load_config(path, True)
+            cached.append((time.perf_counter() - start) * 1000)
+
+        return {'entries': entries * 2, 'parse_ms': min(parsed), 'snapshot_ms': min(cached)}
+    finally:
+        if old_cache is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = old_cache
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def bench_fade(repeat):
+    from .fade import benchmark
+    return [{'engine': name, 'width': w, 'height': h, 'ms': ms}
+            for name, w, h, ms in benchmark(FADE_RESOLUTIONS, repeat=repeat)]
+
+def bench_effects(repeat):
+    """ Each effect chain followed by the dialog's cairo dim, without a budget """
+
+    from gi.repository import GdkPixbuf
+    from .effects import apply_effects, estimate
+    from .fade import fade_cairo
+
+    results = []
+    for effects in (['blur'], ['desaturate'], ['desaturate', 'blur']):
+        for width, height in FADE_RESOLUTIONS:
+            pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, False, 8, width, height)
+            pixbuf.fill(0x336699ff)
+            timings = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                fade_cairo(apply_effects(pixbuf, effects, 70, 0, False), 70)
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append({'effects': effects, 'width': width, 'height': height, 'ms': min(timings),
+                            'estimate_ms': estimate(pixbuf, effects, 70, False)})
+    return results
+
+def bench_dbus(repeat):
+    """ DbusController against the mock services, in its own process as it
+        replaces the system and session buses """
+
+    # Exits with 1 when a check failed, the failures are listed in the results
+    process = subprocess.run([sys.executable, "-m", "oblogout.mockbus", "--repeat", str(repeat)],
+                             stdout=subprocess.PIPE, cwd=SOURCE_DIR)
+    return json.loads(process.stdout.decode())
+
+class StubExecutor(object):
+
+    """ Stands in for ActionExecutor, records the steps instead of running them """
+
+    last = None
+
+    def __init__(self, on_idle=None, wait_children=False):
+        self.on_idle = on_idle
+        self.steps = []
+
+    def add(self, name, action, timeout=None, after=None, when=None):
+        self.steps.append(name)
+
+    def start(self):
+        StubExecutor.last = (time.perf_counter(), self.steps)
+        if self.on_idle:
+            self.on_idle()
+
+def child_startup(config):
+    """ Build the dialog, show it and quit on the first draw """
+
+    from gi.repository import GLib
+    from . import OpenboxLogout
+
+    start = time.perf_counter()
+    app = OpenboxLogout(config, True)
+    built = time.perf_counter()
+    result = {'composited': not app.rendered_effects, 'build_ms': (built - start) * 1000}
+
+    def on_draw(widget, cr):
+        if 'first_draw' not in result:
+            result['first_draw'] = time.monotonic()
+            result['build_to_draw_ms'] = (time.perf_counter() - built) * 1000
+            GLib.idle_add(app.quit, None, True)
+        return False
+
+    app.window.connect_after("draw", on_draw)
+    app.run_logout()
+    return result
+
+def child_dispatch(config, iterations):
+    """ Time the last on_keypress of every configured shortcut to the executor being
+        started, missed counts the shortcuts that didn't start their action """
+
+    from . import OpenboxLogout, actions
+
+    actions.ActionExecutor = StubExecutor
+
+    app = OpenboxLogout(config, True, True)
+    # Only bound once the toolkit is loaded
+    from . import Gtk, Gdk
+
+    app.window.show_all()
+    while Gtk.events_pending():
+        Gtk.main_iteration()
+
+    from .shortcuts import key_presses
+
+    results = {}
+    clock = 0
+    for action, key in app.shortcut_keys:
+        sequence = app.shortcuts.parse(key)
+        if sequence is None:
+            continue
+        # Every key press the shortcut sends, modifiers included, so a
+        # modifier resetting a sequence shows up as a miss
+        presses = key_presses(sequence)
+        timings = []
+        missed = 0
+        for i in range(int(iterations)):
+            # Far enough apart for sequences not to carry over
+            clock += 10000
+            StubExecutor.last = None
+            for keyval, state in presses:
+                event = Gdk.Event.new(Gdk.EventType.KEY_PRESS)
+                event.key.keyval = keyval
+                event.key.state = state
+                clock += 10
+                event.key.time = clock
+
+                start = time.perf_counter()
+                app.on_keypress(app.window, event)
+
+            # Cancel quits without queueing any step
+            if StubExecutor.last is not None and (action in StubExecutor.last[1] or action == "cancel"):
+                timings.append((StubExecutor.last[0] - start) * 1e6)
+            else:
+                missed += 1
+
+        results[action] = {'missed': missed}
+        if timings:
+            timings.sort()
+            results[action].update({'median_us': timings[len(timings) // 2], 'min_us': timings[0], 'max_us': timings[-1]})
+
+    return {'dispatch': results}
+
+def child_capture(repeat):
+    """ Best time of a full screen grab with each capture backend """
+
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gdk
+    from . import capture
+
+    root = Gdk.get_default_root_window()
+    width, height = root.get_width(), root.get_height()
+
+    results = {}
+    for backend in capture.BACKENDS:
+        if not backend.available():
+            results[backend.name] = {'skipped': "unavailable"}
+            continue
+
+        timings = []
+        try:
+            for i in range(int(repeat)):
+                start = time.perf_counter()
+                backend.grab(0, 0, width, height)
+                timings.append((time.perf_counter() - start) * 1000)
+        except capture.CaptureError as ex:
+            results[backend.name] = {'skipped': str(ex)}
+            continue
+        results[backend.name] = {'min_ms': min(timings), 'max_ms': max(timings)}
+
+    return {'capture': results}
+
+def legacy_panel(Gtk, Gdk, names):
+    """ The dialog panel as it was built before dialog.ui, with a widget call
+        per property and modify_bg/modify_fg for the colours """
+
+    mainpanel = Gtk.HBox()
+    buttonpanel = Gtk.HButtonBox()
+    buttonpanel.set_spacing(10)
+    mainpanel.pack_start(Gtk.VBox(), expand=True, fill=True, padding=0)
+    mainpanel.pack_start(buttonpanel, expand=False, fill=False, padding=0)
+    mainpanel.pack_start(Gtk.VBox(), expand=True, fill=True, padding=0)
+
+    for name in names:
+        box = Gtk.VBox()
+        image = Gtk.Image()
+        image.show()
+        button = Gtk.Button()
+        button.set_relief(Gtk.ReliefStyle.NONE)
+        button.modify_bg(Gtk.StateFlags.PRELIGHT, Gdk.color_parse("black"))
+        button.set_focus_on_click(False)
+        button.set_border_width(0)
+        button.set_property('can-focus', False)
+        button.add(image)
+        button.show()
+        box.pack_start(button, expand=False, fill=False, padding=0)
+        label = Gtk.Label(name)
+        label.modify_fg(Gtk.StateFlags.NORMAL, Gdk.color_parse("white"))
+        box.pack_end(label, expand=False, fill=False, padding=0)
+        buttonpanel.pack_start(box, expand=False, fill=False, padding=0)
+    return mainpanel
+
+def builder_panel(dialog, names):
+    """ The dialog panel from the template, as OpenboxLogout builds it """
+
+    panel = dialog.build_panel(names)
+    for name in names:
+        panel.get_object(dialog.button_id("button", name)).get_style_context().add_class(name)
+        panel.get_object(dialog.button_id("label", name)).set_text(name)
+    return panel.get_object("mainpanel")
+
+def child_widgets(repeat):
+    """ Construction and first size request of the panel with every button,
+        built by hand and from the template """
+
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk, Gdk
+    from . import dialog
+    from .config import VALID_BUTTONS
+
+    window = Gtk.Window()
+    window.get_style_context().add_class("oblogout")
+    dialog.add_styles(window.get_screen())
+
+    builds = {
+        'legacy': lambda: legacy_panel(Gtk, Gdk, VALID_BUTTONS),
+        'builder': lambda: builder_panel(dialog, VALID_BUTTONS),
+    }
+
+    results = {}
+    for name, build in builds.items():
+        timings = []
+        for i in range(int(repeat)):
+            start = time.perf_counter()
+            panel = build()
+            window.add(panel)
+            # Styles are only resolved once the widgets are measured
+            panel.get_preferred_size()
+            timings.append((time.perf_counter() - start) * 1000)
+            window.remove(panel)
+            panel.destroy()
+        results[name] = {'buttons': len(VALID_BUTTONS), 'min_ms': min(timings), 'max_ms': max(timings)}
+
+    return {'widgets': results}
+
+def main(argv):
+    output = None
+    width, height = 1920, 1080
+    repeat = 5
+
+    opts, args = getopt.getopt(argv[1:], "o:r:n:", ["output=", "resolution=", "repeat=", "child="])
+    for o, a in opts:
+        if o == "--child":
+            child = {'startup': child_startup, 'dispatch': child_dispatch, 'capture': child_capture,
+                     'widgets': child_widgets}[a]
+            print(json.dumps(child(*args)))
+            return 0
+        elif o in ("-o", "--output"):
+            output = a
+        elif o in ("-r", "--resolution"):
+            width, height = [int(v) for v in a.split("x")]
+        elif o in ("-n", "--repeat"):
+            repeat = int(a)
+
+    results = {
+        'meta': {
+            'time': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'resolution': "%dx%d" % (width, height),
+            'repeat': repeat,
+        },
+        'fade': bench_fade(repeat),
+        'effects': bench_effects(repeat),
+        'load_config': bench_config(repeat),
+    }
+
+    if shutil.which("dbus-daemon"):
+        results['dbus'] = bench_dbus(repeat)
+    else:
+        results['dbus'] = {'skipped': "dbus-daemon not found"}
+
+    if shutil.which("Xvfb"):
+        results['non_composited'] = bench_display(False, width, height, repeat)
+        results['composited'] = bench_display(True, width, height, repeat)
+    else:
+        results['non_composited'] = results['composited'] = {'skipped': "Xvfb not found"}
+
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
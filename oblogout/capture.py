@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Root window capture for the non-composited background. Backends are tried
+# in order, each falling back to the next when it isn't usable:
+#
+#   - shm: XShmGetImage into a shared memory segment through ctypes, the
+#     pixels never go over the X socket. Local X11 displays only
+#   - cairo: the root window painted into an image surface through cairo-xlib,
+#     which reads with XRender and SHM images where the server has them
+#   - gdk: Gdk.pixbuf_get_from_window, always available
+#
+# Every grab is recorded as a 'capture' trace mark with the backend and time.
+
+import time
+import ctypes
+import ctypes.util
+import logging
+
+import cairo
+
+from gi.repository import Gdk
+
+from .timing import mark
+
+logger = logging.getLogger("Capture")
+
+class CaptureError(Exception):
+    pass
+
+class GdkCapture(object):
+
+    name = "gdk"
+
+    def available(self):
+        return True
+
+    def grab(self, x, y, width, height):
+        pixbuf = Gdk.pixbuf_get_from_window(Gdk.get_default_root_window(), x, y, width, height)
+        if pixbuf is None:
+            raise CaptureError("pixbuf_get_from_window failed")
+        return pixbuf
+
+class CairoCapture(object):
+
+    name = "cairo"
+
+    def available(self):
+        return True
+
+    def grab(self, x, y, width, height):
+        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        cr = cairo.Context(surface)
+        Gdk.cairo_set_source_window(cr, Gdk.get_default_root_window(), -x, -y)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.paint()
+        surface.flush()
+        return Gdk.pixbuf_get_from_surface(surface, 0, 0, width, height)
+
+class XImage(ctypes.Structure):
+    _fields_ = [("width", ctypes.c_int), ("height", ctypes.c_int), ("xoffset", ctypes.c_int),
+                ("format", ctypes.c_int), ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+                ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int), ("bitmap_pad", ctypes.c_int),
+                ("depth", ctypes.c_int), ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+                ("red_mask", ctypes.c_ulong), ("green_mask", ctypes.c_ulong), ("blue_mask", ctypes.c_ulong)]
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+                ("shmaddr", ctypes.c_void_p), ("readOnly", ctypes.c_int)]
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+ZPixmap = 2
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+class ShmCapture(object):
+
+    """ MIT-SHM capture on a private Xlib connection. The segment is kept
+        between grabs of the same size, so a daemon only allocates it once """
+
+    name = "shm"
+
+    def __init__(self):
+        self.loaded = None
+        self.display = None
+        self.image = None
+        self.segment = None
+        self.size = None
+
+    def __load(self):
+        x11 = ctypes.util.find_library("X11")
+        xext = ctypes.util.find_library("Xext")
+        if not x11 or not xext:
+            raise CaptureError("libX11 or libXext not found")
+
+        self.x11 = x11 = ctypes.CDLL(x11)
+        self.xext = xext = ctypes.CDLL(xext)
+        self.libc = libc = ctypes.CDLL(None, use_errno=True)
+
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+        x11.XSetErrorHandler.argtypes = [ctypes.c_void_p]
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                         ctypes.c_char_p, ctypes.POINTER(XShmSegmentInfo),
+                                         ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage),
+                                      ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        display = Gdk.Display.get_default()
+        if display.__gtype__.name != "GdkX11Display":
+            raise CaptureError("not an X11 display")
+
+        self.display = x11.XOpenDisplay(display.get_name().encode())
+        if not self.display:
+            raise CaptureError("unable to open %s" % display.get_name())
+        if not xext.XShmQueryExtension(self.display):
+            raise CaptureError("no MIT-SHM extension")
+
+        screen = x11.XDefaultScreen(self.display)
+        self.root = x11.XRootWindow(self.display, screen)
+        self.visual = x11.XDefaultVisual(self.display, screen)
+        self.depth = x11.XDefaultDepth(self.display, screen)
+
+    def available(self):
+        if self.loaded is None:
+            try:
+                self.__load()
+                self.loaded = True
+            except (OSError, AttributeError, CaptureError) as ex:
+                logger.debug("MIT-SHM capture unavailable: %s" % ex)
+                self.loaded = False
+        return self.loaded
+
+    def __trap(self, request, *args):
+        """ Make an Xlib request and sync, catching X errors instead of letting
+            Xlib's default handler exit. Returns (result, errors) """
+
+        errors = []
+        handler = XErrorHandler(lambda display, event: errors.append(event) or 0)
+        previous = self.x11.XSetErrorHandler(ctypes.cast(handler, ctypes.c_void_p))
+        try:
+            result = request(*args)
+            self.x11.XSync(self.display, 0)
+        finally:
+            self.x11.XSetErrorHandler(previous)
+        return result, errors
+
+    def __release(self):
+        if self.image is not None:
+            self.xext.XShmDetach(self.display, ctypes.byref(self.segment))
+            self.libc.shmdt(ctypes.c_void_p(self.segment.shmaddr))
+            # The data is the segment, keep XDestroyImage from freeing it
+            self.image.contents.data = None
+            self.x11.XDestroyImage(self.image)
+            self.image = self.segment = self.size = None
+
+    def __allocate(self, width, height):
+        segment = XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, self.visual, self.depth, ZPixmap, None,
+                                          ctypes.byref(segment), width, height)
+        if not image:
+            raise CaptureError("XShmCreateImage failed")
+
+        ximage = image.contents
+        if ximage.bits_per_pixel != 32 or ximage.bytes_per_line != width * 4 or ximage.red_mask != 0xff0000:
+            self.x11.XDestroyImage(image)
+            raise CaptureError("unsupported visual, %d bpp" % ximage.bits_per_pixel)
+
+        segment.shmid = self.libc.shmget(IPC_PRIVATE, ximage.bytes_per_line * height, IPC_CREAT | 0o600)
+        if segment.shmid < 0:
+            self.x11.XDestroyImage(image)
+            raise CaptureError("shmget failed: %s" % ctypes.get_errno())
+        segment.shmaddr = self.libc.shmat(segment.shmid, None, 0)
+        if segment.shmaddr in (None, ctypes.c_void_p(-1).value):
+            self.libc.shmctl(segment.shmid, IPC_RMID, None)
+            self.x11.XDestroyImage(image)
+            raise CaptureError("shmat failed: %s" % ctypes.get_errno())
+        ximage.data = segment.shmaddr
+        segment.readOnly = 0
+
+        # A remote server can't attach
+        attached, errors = self.__trap(self.xext.XShmAttach, self.display, ctypes.byref(segment))
+
+        # Freed once both sides have detached
+        self.libc.shmctl(segment.shmid, IPC_RMID, None)
+
+        if not attached or errors:
+            self.libc.shmdt(ctypes.c_void_p(segment.shmaddr))
+            ximage.data = None
+            self.x11.XDestroyImage(image)
+            raise CaptureError("XShmAttach failed")
+
+        self.image, self.segment, self.size = image, segment, (width, height)
+
+    def grab(self, x, y, width, height):
+        if self.size != (width, height):
+            self.__release()
+            self.__allocate(width, height)
+
+        # BadMatch when the rectangle isn't inside the root, e.g. resized under the daemon
+        got, errors = self.__trap(self.xext.XShmGetImage, self.display, self.root, self.image,
+                                  x, y, ctypes.c_ulong(-1).value)
+        if not got or errors:
+            raise CaptureError("XShmGetImage failed")
+
+        # The segment is read in place, converted once into the pixbuf
+        size = width * height * 4
+        data = (ctypes.c_char * size).from_address(self.segment.shmaddr)
+        surface = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_RGB24, width, height, width * 4)
+        pixbuf = Gdk.pixbuf_get_from_surface(surface, 0, 0, width, height)
+        surface.finish()
+        return pixbuf
+
+BACKENDS = [ShmCapture(), CairoCapture(), GdkCapture()]
+
+def get_backend(name):
+    for backend in BACKENDS:
+        if backend.name == name:
+            return backend
+    raise KeyError(name)
+
+def grab(x, y, width, height, backends=None):
+    """ Capture a rectangle of the root window as a pixbuf with the first
+        backend that works. backends is a list of names, all by default """
+
+    for backend in BACKENDS:
+        if backends is not None and backend.name not in backends:
+            continue
+        if not backend.available():
+            continue
+
+        start = time.perf_counter()
+        try:
+            pixbuf = backend.grab(x, y, width, height)
+        except (CaptureError, cairo.Error) as ex:
+            logger.debug("%s capture failed, falling back: %s" % (backend.name, ex))
+            continue
+
+        ms = (time.perf_counter() - start) * 1000
+        mark("capture", backend=backend.name, ms=ms)
+        logger.debug("Captured %dx%d with %s in %.1f ms" % (width, height, backend.name, ms))
+        return pixbuf
+
+    raise CaptureError("no capture backend could grab the screen")
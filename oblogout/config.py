@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Configuration loading. The resolved settings are plain Python values, so
+# they can be stored as a marshal snapshot keyed on the config file and the
+# theme directories, and loaded in a single read on the next start.
+
+import os
+import marshal
+import hashlib
+import logging
+import configparser
+
+from .i18n import _, N_
+from .themes import MANIFEST, theme_prefixes, read_index, probe_icons
+
+SNAPSHOT_VERSION = 8
+SYSTEM_CACHE = "/var/cache/oblogout"
+
+# The names are the button labels, translated when the buttons are built
+VALID_BUTTONS = [N_('cancel'), N_('logout'), N_('restart'), N_('shutdown'), N_('suspend'), N_('hibernate'),
+                 N_('safesuspend'), N_('lock'), N_('switch')]
+BACKENDS = ("HAL", "ConsoleKit", "logind")
+VALID_COMMANDS = ['logout', 'restart', 'shutdown', 'suspend', 'hibernate', 'safesuspend', 'lock', 'switch']
+VALID_EFFECTS = ['dim', 'blur', 'desaturate']
+
+logger = logging.getLogger("Config")
+
+def _stat(path):
+    """ Identity of a snapshot source, None when it doesn't exist """
+    try:
+        st = os.stat(os.path.expanduser(path))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ino)
+
+def parse_config(config, local_mode=False):
+    """ Parse the configuration file and resolve the theme, when encountering a issue
+        change safe defaults. Returns (settings, sources), sources being the paths the
+        result depends on """
+
+    parser = configparser.ConfigParser()
+    parser.read(config)
+
+    # Set some safe defaults
+    settings = {
+        'backend': "",
+        'monitor': 0,
+        'lock_on_hibernate': True,
+        'lock_on_suspend': True,
+        'opacity': 50,
+        'button_theme': "default",
+        'bgcolor': "black",
+        'progressive': False,
+        'effects': [],
+        'effect_budget': 50,
+        'bounded_memory': False,
+        'shortcuts': [],
+        'commands': {},
+        'timeouts': {},
+    }
+    blist = ""
+
+    if parser.has_section("settings"):
+
+        if parser.has_option("settings","backend"):
+           settings['backend'] = parser.get("settings","backend")
+
+        if parser.has_option("settings", "monitor"):
+           if parser.get("settings", "monitor").strip() == "all":
+               settings['monitor'] = "all"
+           else:
+               settings['monitor'] = parser.getint("settings", "monitor")
+
+        if parser.has_option("settings", "disable_lock_on"):
+            lock_on_settings = [s.strip() for s in parser.get("settings", "disable_lock_on").split(",")]
+            settings['lock_on_hibernate'] = "hibernate" not in lock_on_settings
+            settings['lock_on_suspend'] = "suspend" not in lock_on_settings
+
+    # Check the looks section and load the config as required
+    if parser.has_section("looks"):
+
+        if parser.has_option("looks", "opacity"):
+            settings['opacity'] = parser.getint("looks", "opacity")
+
+        if parser.has_option("looks","buttontheme"):
+            settings['button_theme'] = parser.get("looks", "buttontheme")
+
+        if parser.has_option("looks", "bgcolor"):
+            settings['bgcolor'] = parser.get("looks", "bgcolor")
+
+        if parser.has_option("looks", "progressive"):
+            settings['progressive'] = parser.getboolean("looks", "progressive")
+
+        # Effects run in order before the fade, dim alone is just the fade
+        if parser.has_option("looks", "effect"):
+            for effect in [e.strip().lower() for e in parser.get("looks", "effect").split(",")]:
+                if effect not in VALID_EFFECTS:
+                    logger.warning("Effect %s is not a valid effect name, removing" % effect)
+                elif effect != "dim":
+                    settings['effects'].append(effect)
+
+        if parser.has_option("looks", "effect_budget"):
+            settings['effect_budget'] = parser.getint("looks", "effect_budget")
+
+        if parser.has_option("looks", "bounded_memory"):
+            settings['bounded_memory'] = parser.getboolean("looks", "bounded_memory")
+
+        if parser.has_option("looks", "buttons"):
+            blist = parser.get("looks", "buttons")
+
+    # Parse shortcuts section and load them into a array for later reference.
+    if parser.has_section("shortcuts"):
+        settings['shortcuts'] = parser.items("shortcuts")
+        logger.debug("Shortcut Options: %s" % settings['shortcuts'])
+
+    # Parse in commands section of the configuration file, only keeping valid keys
+    if parser.has_section("commands"):
+        for key, value in parser.items("commands"):
+            logger.debug("Setting cmd_%s as %s" % (key, value))
+            if key in VALID_COMMANDS:
+                settings['commands'][key] = value
+
+    # Per action timeouts in seconds, actions run without one by default
+    if parser.has_section("timeouts"):
+        for key, value in parser.items("timeouts"):
+            if key in VALID_COMMANDS:
+                try:
+                    settings['timeouts'][key] = float(value)
+                except ValueError:
+                    logger.warning("Timeout %s for %s is not a number, ignoring" % (value, key))
+
+    # Parse button list from config file.
+    if not blist or blist == "default":
+        buttons = list(VALID_BUTTONS)
+    else:
+        buttons = []
+        for button in [b.strip() for b in blist.split(",")]:
+            if button in VALID_BUTTONS:
+                buttons.append(button)
+            else:
+                logger.warning(_("Button %s is not a valid button name, removing") % button)
+
+    settings['buttons'] = buttons
+
+    # The user theme is kept with a ~ so the snapshot is valid for any $HOME
+    user_prefix, system_prefix = theme_prefixes(local_mode)
+    user_theme = "%s/%s/oblogout" % (user_prefix, settings['button_theme'])
+    system_theme = "%s/%s/oblogout" % (system_prefix, settings['button_theme'])
+
+    if os.path.exists(os.path.expanduser(user_theme)):
+        # Found a valid theme folder in the userdir, use that
+        settings['img_path'] = user_theme
+        logger.info("Using user theme at %s" % user_theme)
+    elif os.path.exists(system_theme):
+        settings['img_path'] = system_theme
+    else:
+        logger.warning("Button theme %s not found, reverting to foom" % settings['button_theme'])
+        settings['button_theme'] = 'foom'
+        settings['img_path'] = "%s/foom/oblogout" % system_prefix
+
+    # One read of the theme manifest, or a look for every icon without one
+    icons = read_index(settings['img_path'])
+    if icons is None:
+        logger.debug("No manifest in %s, run oblogout --index-themes" % settings['img_path'])
+        icons = probe_icons(settings['img_path'], buttons)
+        theme_sources = [settings['img_path']]
+        # An icon overwritten in place leaves the directory alone, the stored
+        # mtimes are only current while the icons themselves are unchanged
+        theme_sources += [icon['path'] for name, icon in icons.items() if name in buttons]
+    else:
+        theme_sources = [os.path.join(settings['img_path'], MANIFEST)]
+    settings['icons'] = dict((name, icons[name]) for name in buttons if name in icons)
+
+    # Both theme locations are recorded, a missing one with a None identity, so
+    # installing the configured theme later invalidates a foom fallback
+    sources = [os.path.abspath(config), user_theme]
+    theme_sources.insert(0, system_theme)
+    sources += [source if source.startswith("~") else os.path.abspath(source) for source in theme_sources]
+    sources = sorted(set(sources), key=sources.index)
+    return settings, sources
+
+def snapshot_paths(config, local_mode=False):
+    """ Candidate snapshot files for a config, the user cache first """
+
+    key = hashlib.sha1(("%s:%d" % (os.path.abspath(config), bool(local_mode))).encode()).hexdigest()
+    name = "config-%s.snapshot" % key
+
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return [os.path.join(cache, "oblogout", name), os.path.join(SYSTEM_CACHE, name)]
+
+def read_snapshot(path):
+    """ Return the settings stored in a snapshot, or None if it's missing or stale """
+
+    try:
+        with open(path, "rb") as f:
+            snapshot = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+
+    for source, identity in snapshot['sources']:
+        if _stat(source) != identity:
+            logger.debug("Config snapshot %s is stale, %s changed" % (path, source))
+            return None
+
+    return snapshot['settings']
+
+def write_snapshot(path, settings, sources):
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'sources': [(source, _stat(source)) for source in sources],
+        'settings': settings,
+    }
+
+    tmp = "%s.%d" % (path, os.getpid())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(marshal.dumps(snapshot))
+    os.replace(tmp, path)
+
+def load_config(config, local_mode=False):
+    """ Load the resolved settings, from a snapshot when one is up to date """
+
+    paths = snapshot_paths(config, local_mode)
+    for path in paths:
+        settings = read_snapshot(path)
+        if settings is not None:
+            logger.debug("Using config snapshot %s" % path)
+            return settings
+
+    settings, sources = parse_config(config, local_mode)
+    try:
+        write_snapshot(paths[0], settings, sources)
+    except OSError as ex:
+        logger.debug("Unable to write config snapshot: %s" % ex)
+    return settings
+
+def compile_config(config, local_mode=False):
+    """ Build the snapshot ahead of time, in the system cache when run as root.
+        Returns the path of the snapshot written """
+
+    settings, sources = parse_config(config, local_mode)
+    user, system = snapshot_paths(config, local_mode)
+
+    path = system if os.getuid() == 0 else user
+
+    write_snapshot(path, settings, sources)
+    return path
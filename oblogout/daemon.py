@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Resident mode: a pre-built, hidden OpenboxLogout window is kept alive and
+# shown on request through a Unix socket, so "oblogout --show" only costs a
+# single round trip instead of a full start-up.
+
+import os
+import struct
+import socket
+import logging
+
+from .runtime import runtime_dir
+
+SOCKET_NAME = "oblogout.sock"
+
+# pid, uid, gid
+PEERCRED = struct.Struct("3i")
+
+def socket_path():
+    """ Per-user socket path in the private runtime directory, None without one """
+
+    runtime = runtime_dir()
+    if runtime is None:
+        return None
+    return os.path.join(runtime, SOCKET_NAME)
+
+def peer_uid(sock):
+    pid, uid, gid = PEERCRED.unpack(sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size))
+    return uid
+
+def send_command(command, path=None, timeout=2.0):
+    """ Send a command to a running daemon and return its reply, or None if no
+        daemon of this user answered """
+
+    path = path or socket_path()
+    if path is None:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+        # Only trust a daemon run by the same user
+        if peer_uid(sock) != os.getuid():
+            logging.getLogger("LogoutDaemon").warning("%s is served by another user, ignoring it" % path)
+            return None
+        sock.sendall(("%s\n" % command).encode())
+        return sock.makefile("r").readline().strip()
+    except (OSError, socket.timeout):
+        return None
+    finally:
+        sock.close()
+
+def show(path=None):
+    """ Ask the daemon to display its window """
+    return send_command("show", path) == "ok"
+
+class LogoutDaemon(object):
+
+    """ LogoutDaemon listens on a Unix socket and shows the pre-built window of
+        an OpenboxLogout instance each time a client asks for it """
+
+    def __init__(self, app, path=None):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.app = app
+        self.path = path or socket_path()
+        self.sock = None
+        self.watch = None
+
+    def __bind(self):
+        if self.path is None:
+            raise RuntimeError("no private runtime directory for the socket")
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+        except OSError:
+            # Either another daemon owns the socket or a dead one left it behind
+            if send_command("ping", self.path) == "ok":
+                sock.close()
+                raise RuntimeError("oblogout daemon already running on %s" % self.path)
+            self.logger.debug("Removing stale socket %s" % self.path)
+            try:
+                os.unlink(self.path)
+                sock.bind(self.path)
+            except OSError as ex:
+                # e.g. another user's socket under the /tmp fallback
+                sock.close()
+                raise RuntimeError("unable to listen on %s: %s" % (self.path, ex))
+
+        os.chmod(self.path, 0o600)
+        sock.listen(4)
+        return sock
+
+    def start(self):
+        """ Start listening, requests are served from the GTK main loop """
+
+        from gi.repository import GLib
+
+        self.sock = self.__bind()
+        self.watch = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_HIGH, GLib.IO_IN, self.__on_connect)
+        self.logger.info("Listening on %s" % self.path)
+
+    def stop(self):
+        if self.watch is not None:
+            from gi.repository import GLib
+            GLib.source_remove(self.watch)
+            self.watch = None
+
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def __on_connect(self, fd, condition):
+        conn, addr = self.sock.accept()
+        conn.settimeout(1.0)
+        try:
+            command = conn.makefile("r").readline().strip()
+            self.logger.debug("Received command: %s" % command)
+            conn.sendall(("%s\n" % self.handle(command)).encode())
+        except (OSError, socket.timeout) as ex:
+            self.logger.warning("Client error: %s" % ex)
+        finally:
+            conn.close()
+        return True
+
+    def handle(self, command):
+        if command == "ping":
+            return "ok"
+        elif command == "show":
+            self.app.show()
+            return "ok"
+        elif command == "quit":
+            self.app.quit(force=True)
+            return "ok"
+        return "unknown command"
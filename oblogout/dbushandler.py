@@ -24,7 +24,366 @@
 
 import logging
 import os
+import json
+import time
 import dbus
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+
+from .runtime import runtime_dir, write_private
+
+# Asynchronous calls are dispatched from the GLib main loop
+DBusGMainLoop(set_as_default=True)
+
+# Capability queries needed by each action, actions not listed are always possible
+ABILITY_QUERIES = {
+    'HAL': {
+        'suspend': ('suspend',),
+        'hibernate': ('hibernate',),
+        'safesuspend': ('suspend', 'hibernate'),
+    },
+    'ConsoleKit': {
+        'suspend': ('suspend',),
+        'hibernate': ('hibernate',),
+        'safesuspend': ('suspend', 'hibernate'),
+    },
+    'logind': {
+        'shutdown': ('poweroff',),
+        'restart': ('reboot',),
+        'suspend': ('suspend',),
+        'hibernate': ('hibernate',),
+        'safesuspend': ('hybridsleep',),
+    },
+}
+
+# (bus name, object path, interface, method, signature, args) per backend and query
+ABILITY_CALLS = {
+    'HAL': {
+        'suspend': ("org.freedesktop.Hal", "/org/freedesktop/Hal/devices/computer", "org.freedesktop.Hal.Device",
+                    "GetPropertyBoolean", "s", ("power_management.can_suspend",)),
+        'hibernate': ("org.freedesktop.Hal", "/org/freedesktop/Hal/devices/computer", "org.freedesktop.Hal.Device",
+                      "GetPropertyBoolean", "s", ("power_management.can_hibernate",)),
+    },
+    'ConsoleKit': {
+        'suspend': ("org.freedesktop.UPower", "/org/freedesktop/UPower", "org.freedesktop.DBus.Properties",
+                    "Get", "ss", ("org.freedesktop.UPower", "CanSuspend")),
+        'hibernate': ("org.freedesktop.UPower", "/org/freedesktop/UPower", "org.freedesktop.DBus.Properties",
+                      "Get", "ss", ("org.freedesktop.UPower", "CanHibernate")),
+    },
+    'logind': dict((query, ("org.freedesktop.login1", "/org/freedesktop/login1", "org.freedesktop.login1.Manager",
+                            method, "", ()))
+                   for query, method in (('poweroff', "CanPowerOff"), ('reboot', "CanReboot"),
+                                         ('suspend', "CanSuspend"), ('hibernate', "CanHibernate"),
+                                         ('hybridsleep', "CanHybridSleep"))),
+}
+
+def ability_value(value):
+    """ logind answers yes, no, challenge or na, the others a boolean """
+    if isinstance(value, str):
+        return value in ("yes", "challenge")
+    return bool(value)
+
+# Errors meaning the backend service isn't there at all
+UNAVAILABLE_ERRORS = ("org.freedesktop.DBus.Error.ServiceUnknown",
+                      "org.freedesktop.DBus.Error.NameHasNoOwner",
+                      "org.freedesktop.DBus.Error.Spawn.ServiceNotFound")
+
+# Services each backend's actions go to, probe() checks they can be reached
+SERVICES = {
+    'HAL': ("org.freedesktop.Hal",),
+    'ConsoleKit': ("org.freedesktop.ConsoleKit", "org.freedesktop.UPower"),
+    'logind': ("org.freedesktop.login1",),
+}
+
+ABILITY_TTL = 300
+
+# PolicyKit actions checked before each HAL action
+POLKIT_ACTIONS = {
+    'restart': ("org.freedesktop.hal.power-management.reboot",
+                "org.freedesktop.hal.power-management.reboot-multiple-sessions"),
+    'shutdown': ("org.freedesktop.hal.power-management.shutdown",
+                 "org.freedesktop.hal.power-management.shutdown-multiple-sessions"),
+    'suspend': ("org.freedesktop.hal.power-management.suspend",),
+    'hibernate': ("org.freedesktop.hal.power-management.hibernate",),
+}
+
+# How long a plain "yes" from the policy is trusted
+AUTH_TTL = 300
+
+# Errors meaning an authorization PolicyKit answered for isn't granted any more
+AUTH_ERRORS = ("org.freedesktop.Hal.Device.PermissionDeniedByPolicy",
+               "org.freedesktop.DBus.Error.AccessDenied")
+
+def session_id():
+    return os.environ.get("XDG_SESSION_ID") or str(os.getuid())
+
+def ability_cache_path():
+    """ Per-session cache of the probed abilities, None when it can't be kept """
+    runtime = runtime_dir()
+    if runtime is None:
+        return None
+    return os.path.join(runtime, "oblogout-abilities-%s.json" % session_id())
+
+def load_ability_cache(backend, ttl=ABILITY_TTL):
+    """ Cached (available, results) for a backend, or None when missing or expired """
+
+    path = ability_cache_path()
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)[backend]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if time.time() - entry['time'] > ttl:
+        return None
+    return entry['available'], entry['results']
+
+def save_ability_cache(backend, available, results):
+    path = ability_cache_path()
+    if path is None:
+        return
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    cache[backend] = {'time': time.time(), 'available': available, 'results': results}
+    write_private(path, cache)
+
+def auth_retention(answer):
+    """ How long an authorization can be cached from the answer PolicyKit gave
+        before it was granted: "policy" for a plain yes, "session" or "always"
+        when obtained with keep_session or keep_always, None for one-shot
+        grants and anything else """
+
+    if answer == "yes":
+        return "policy"
+    elif answer.endswith("_keep_always"):
+        return "always"
+    elif answer.endswith("_keep_session"):
+        return "session"
+    return None
+
+class AuthorizationCache(object):
+
+    """ Granted PolicyKit authorizations, keyed by session and action id and
+        shared by every process of the user. Grants kept always are valid in
+        any session. Nothing is cached without a private runtime directory """
+
+    def __init__(self, path=None, session=None):
+        if path is None and runtime_dir() is not None:
+            path = os.path.join(runtime_dir(), "oblogout-authorizations-%d.json" % os.getuid())
+        self.path = path
+        self.session = session or session_id()
+        self.entries = None
+
+    def __load(self):
+        if self.path is None:
+            return {}
+        if self.entries is None:
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, action):
+        """ True if action is known to be authorized """
+
+        entries = self.__load()
+        entry = entries.get("%s %s" % (self.session, action)) or entries.get("* %s" % action)
+        if not entry:
+            return False
+        if entry['retain'] == "policy" and time.time() - entry['time'] > AUTH_TTL:
+            return False
+        return True
+
+    def put(self, action, retain):
+        if retain is None or self.path is None:
+            return
+
+        entries = self.__load()
+        # Session grants die with their session
+        for key in list(entries):
+            if not key.startswith(("%s " % self.session, "* ")):
+                del entries[key]
+        session = "*" if retain == "always" else self.session
+        entries["%s %s" % (session, action)] = {'time': time.time(), 'retain': retain}
+        write_private(self.path, entries)
+
+    def drop(self, action):
+        """ Forget action, e.g. when the grant was revoked """
+
+        entries = self.__load()
+        keys = ["%s %s" % (self.session, action), "* %s" % action]
+        if any(entries.pop(key, None) for key in keys):
+            write_private(self.path, entries)
+
+# Connections and interface proxies are shared by every controller for the
+# life of the process. Proxies are made without introspection and follow the
+# service's owner, so a warm proxy costs exactly one round trip per call.
+_buses = {}
+_interfaces = {}
+
+# Proxies each backend's actions go through, see DbusController.warm_up()
+WARM_UP = {
+    'HAL': ("_halpm", "_polkit", "_consolekit"),
+    'ConsoleKit': ("_consolekit", "_upower"),
+    'logind': ("_logind",),
+}
+
+def get_bus(kind):
+    """ The shared "system" or "session" bus connection, opened on first use """
+    try:
+        return _buses[kind]
+    except KeyError:
+        bus = _buses[kind] = dbus.SystemBus() if kind == "system" else dbus.SessionBus()
+        return bus
+
+def get_interface(kind, name, path, interface):
+    """ Memoised proxy for interface on the object at path """
+    key = (kind, name, path, interface)
+    try:
+        return _interfaces[key]
+    except KeyError:
+        proxy = get_bus(kind).get_object(name, path, introspect=False, follow_name_owner_changes=True)
+        iface = _interfaces[key] = dbus.Interface(proxy, interface)
+        return iface
+
+class SessionCounter(object):
+
+    """ Running count of the ConsoleKit sessions on all seats. The seats are
+        queried all at once when started, then the seat and session signals
+        keep the count current so reading it costs nothing """
+
+    def __init__(self):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.seats = {}
+        self.ready = False
+        self.started = False
+        self.subscribed = False
+        # Bumped on every (re)start, answers to an earlier listing are dropped
+        self.generation = 0
+        self.pending = 0
+        self.waiters = []
+
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self.generation += 1
+        self.seats = {}
+
+        # Subscribe before listing, nothing added in between can be missed
+        if not self.subscribed:
+            self.__subscribe()
+
+        generation = self.generation
+        manager = get_interface("system", "org.freedesktop.ConsoleKit", "/org/freedesktop/ConsoleKit/Manager",
+                                "org.freedesktop.ConsoleKit.Manager")
+        manager.GetSeats(reply_handler=lambda seats: self.__on_seats(generation, seats),
+                         error_handler=lambda ex: self.__on_error(generation, ex))
+
+    def __subscribe(self):
+        self.subscribed = True
+        bus = get_bus("system")
+        bus.add_signal_receiver(self.__on_seat_added, "SeatAdded", "org.freedesktop.ConsoleKit.Manager",
+                                "org.freedesktop.ConsoleKit")
+        bus.add_signal_receiver(self.__on_seat_removed, "SeatRemoved", "org.freedesktop.ConsoleKit.Manager",
+                                "org.freedesktop.ConsoleKit")
+        bus.add_signal_receiver(self.__on_session_added, "SessionAdded", "org.freedesktop.ConsoleKit.Seat",
+                                "org.freedesktop.ConsoleKit", path_keyword="seat")
+        bus.add_signal_receiver(self.__on_session_removed, "SessionRemoved", "org.freedesktop.ConsoleKit.Seat",
+                                "org.freedesktop.ConsoleKit", path_keyword="seat")
+
+    def count(self, timeout=5):
+        """ Number of sessions, waiting up to timeout seconds for the first
+            answers if needed. None when ConsoleKit couldn't be asked """
+
+        self.start()
+        if not self.ready and self.started:
+            loop = GLib.MainLoop()
+            quit = loop.quit
+            self.waiters.append(quit)
+            timer = GLib.timeout_add(int(timeout * 1000), quit)
+            loop.run()
+            if quit in self.waiters:
+                self.logger.warning("Timed out counting sessions")
+                self.waiters.remove(quit)
+            else:
+                GLib.source_remove(timer)
+
+        if not self.ready:
+            return None
+        return sum(len(sessions) for sessions in self.seats.values())
+
+    def __done(self):
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def __on_seats(self, generation, seats):
+        if generation != self.generation:
+            return
+        self.pending = len(seats)
+        if not seats:
+            self.ready = True
+            self.__done()
+        for sid in seats:
+            self.__query(sid)
+
+    def __query(self, sid):
+        generation = self.generation
+        seat = get_interface("system", "org.freedesktop.ConsoleKit", sid, "org.freedesktop.ConsoleKit.Seat")
+        seat.GetSessions(reply_handler=lambda sessions: self.__on_sessions(generation, sid, sessions),
+                         error_handler=lambda ex: self.__on_error(generation, ex))
+
+    def __on_sessions(self, generation, sid, sessions):
+        if generation != self.generation:
+            return
+        self.seats.setdefault(sid, set()).update(sessions)
+        if not self.ready:
+            self.pending -= 1
+            if self.pending <= 0:
+                self.ready = True
+                self.__done()
+
+    def __on_error(self, generation, ex):
+        if generation != self.generation or not self.started:
+            return
+        self.logger.warning("Unable to count sessions: %s" % ex)
+        # Start over on the next count
+        self.started = False
+        self.ready = False
+        self.seats = {}
+        self.__done()
+
+    # The receivers stay subscribed across restarts, they do nothing while stopped
+
+    def __on_seat_added(self, sid):
+        if not self.started:
+            return
+        self.seats.setdefault(sid, set())
+        if not self.ready:
+            # Its answer is counted along with the listing's
+            self.pending += 1
+        self.__query(sid)
+
+    def __on_seat_removed(self, sid):
+        if self.started:
+            self.seats.pop(sid, None)
+
+    def __on_session_added(self, ssid, seat=None):
+        if self.started:
+            self.seats.setdefault(seat, set()).add(ssid)
+
+    def __on_session_removed(self, ssid, seat=None):
+        if self.started:
+            self.seats.get(seat, set()).discard(ssid)
 
 class DbusController (object):
 
@@ -34,61 +393,70 @@ class DbusController (object):
     @property
     def _sysbus (self):
         """System DBus"""
-        if not hasattr (DbusController, "__sysbus"):
-            DbusController.__sysbus = dbus.SystemBus ()
-        return DbusController.__sysbus
+        return get_bus("system")
 
     @property
     def _sessbus (self):
         """Session DBus"""
-        if not hasattr (DbusController, "__sessbus"):
-            DbusController.__sessbus = dbus.SessionBus ()
-        return DbusController.__sessbus
+        return get_bus("session")
 
     @property
     def _upower (self):
         """Upower object"""
-        if not hasattr (DbusController, "__upower"):
-           upower = self._sysbus.get_object ("org.freedesktop.UPower", "/org/freedesktop/UPower")
-           DbusController.__upower = dbus.Interface(upower, 'org.freedesktop.UPower')
-        return DbusController.__upower
+        return get_interface("system", "org.freedesktop.UPower", "/org/freedesktop/UPower", "org.freedesktop.UPower")
 
     @property
     def _polkit (self):
         """PolicyKit object"""
-        if not hasattr (DbusController, "__polkit"):
-            pk = self._sysbus.get_object ("org.freedesktop.PolicyKit", "/")
-            DbusController.__polkit = dbus.Interface(pk, 'org.freedesktop.PolicyKit')
-        return DbusController.__polkit
+        return get_interface("system", "org.freedesktop.PolicyKit", "/", "org.freedesktop.PolicyKit")
 
     @property
     def _consolekit (self):
         """ConsoleKit object"""
-        if not hasattr (DbusController, "__consolekit"):
-            consolekit = self._sysbus.get_object ("org.freedesktop.ConsoleKit", "/org/freedesktop/ConsoleKit/Manager")
-            DbusController.__consolekit = dbus.Interface(consolekit, "org.freedesktop.ConsoleKit.Manager")
-        return DbusController.__consolekit
+        return get_interface("system", "org.freedesktop.ConsoleKit", "/org/freedesktop/ConsoleKit/Manager",
+                             "org.freedesktop.ConsoleKit.Manager")
+
+    @property
+    def _logind (self):
+        """logind manager object"""
+        return get_interface("system", "org.freedesktop.login1", "/org/freedesktop/login1",
+                             "org.freedesktop.login1.Manager")
 
     @property
     def _halpm (self):
         """HAL controller object"""
-        if not hasattr (DbusController, "__halpm"):
-            hal = self._sysbus.get_object ("org.freedesktop.Hal", "/org/freedesktop/Hal/devices/computer")
-            DbusController.__halpm  = dbus.Interface(hal, "org.freedesktop.Hal.Device.SystemPowerManagement")
-        return DbusController.__halpm
+        return get_interface("system", "org.freedesktop.Hal", "/org/freedesktop/Hal/devices/computer",
+                             "org.freedesktop.Hal.Device.SystemPowerManagement")
 
     @property
     def _authagent (self):
         """AuthenticationAgent object"""
-        if not hasattr (DbusController, "__authagent"):
-            autha = self._sessbus.get_object ("org.freedesktop.PolicyKit.AuthenticationAgent", "/", "org.gnome.PolicyKit.AuthorizationManager.SingleInstance")
-            DbusController.__authagent = dbus.Interface(autha,'org.freedesktop.PolicyKit.AuthenticationAgent')
-
-        return DbusController.__authagent
+        return get_interface("session", "org.freedesktop.PolicyKit.AuthenticationAgent", "/",
+                             "org.freedesktop.PolicyKit.AuthenticationAgent")
 
     def __init__(self, backend):
         self.logger = logging.getLogger(self.__class__.__name__)
         self.backend = backend
+        self.sessions = SessionCounter()
+        self.authorizations = AuthorizationCache()
+        # PolicyKit answers from precheck() for actions not yet authorized
+        self.requirements = {}
+
+    def warm_up(self, actions=()):
+        """ Open the connections and proxies the backend's actions need, so that
+            running one is a single method call, and check the PolicyKit
+            authorizations of actions. Returns False to be used as an idle callback """
+
+        try:
+            for name in WARM_UP.get(self.backend, ()):
+                getattr(self, name)
+            # HAL's restart and shutdown policies depend on the session count
+            if self.backend == "HAL":
+                self.sessions.start()
+                self.precheck(actions)
+        except dbus.DBusException as ex:
+            self.logger.debug("Unable to warm up %s: %s" % (self.backend, ex))
+        return False
 
     def __check_perms(self, id):
         """ Check if we have permissions for a action """
@@ -96,7 +464,7 @@ class DbusController (object):
         self.logger.debug('Checking permissions for %s' % id)
 
         #try:
-        res = self._polkit.IsProcessAuthorized(id, os.getpid(), False)
+        res = self._polkit.IsProcessAuthorized(id, dbus.UInt32(os.getpid()), False)
         #except:
         #    return False
 
@@ -105,34 +473,153 @@ class DbusController (object):
             return True
         else:
             self.logger.debug("Not authorised to use, requires %s" % res)
+            self.requirements[id] = str(res)
             return False
 
     def __auth_perms(self, id):
         """ Check if we have permissions for a action, if not, try to obtain them via PolicyKit """
 
-        if self.__check_perms(id):
+        if self.authorizations.get(id):
+            return True
+        elif self.__check_perms(id):
+            self.authorizations.put(id, auth_retention("yes"))
             return True
         else:
 
             self.logger.debug('Attempting to obtain %s' % id)
-            grant = self._authagent.ObtainAuthorization(id, 0, os.getpid(), timeout=300, dbus_interface = "org.freedesktop.PolicyKit.AuthenticationAgent")
+            grant = self._authagent.ObtainAuthorization(id, dbus.UInt32(0), dbus.UInt32(os.getpid()), timeout=300)
             self.logger.debug("Result: %s" % bool(grant))
 
-            return self.__check_perms(id)
-            #return bool(grant)
+            requirement = self.requirements.pop(id)
+            if self.__check_perms(id):
+                self.authorizations.put(id, auth_retention(requirement))
+                return True
+            return False
+
+    def precheck(self, actions):
+        """ Ask PolicyKit about the authorizations actions need, all at once """
+
+        pid = dbus.UInt32(os.getpid())
+        for action in actions:
+            for id in POLKIT_ACTIONS.get(action, ()):
+                if self.authorizations.get(id) or id in self.requirements:
+                    continue
+                self._polkit.IsProcessAuthorized(id, pid, False,
+                                                 reply_handler=lambda res, id=id: self.__on_checked(id, res),
+                                                 error_handler=lambda ex, id=id: self.logger.debug(
+                                                     "Unable to check %s: %s" % (id, ex)))
+
+    def __on_checked(self, id, res, callback=None):
+        res = str(res)
+        self.logger.debug("PolicyKit answer for %s: %s" % (id, res))
+        if res == "yes":
+            self.authorizations.put(id, auth_retention(res))
+        else:
+            self.requirements[id] = res
+        if callback:
+            callback(res)
+
+    def __authorize(self, id, callback):
+        """ Find out if id is authorized without blocking, obtaining it through the
+            authentication agent when PolicyKit asks for it; calls callback(authorized) """
+
+        def obtain(requirement):
+            if requirement == "yes":
+                callback(True)
+                return
+            elif not requirement.startswith("auth_"):
+                callback(False)
+                return
+
+            def obtained(grant):
+                self.logger.debug("Result: %s" % bool(grant))
+                if grant:
+                    self.requirements.pop(id, None)
+                    self.authorizations.put(id, auth_retention(requirement))
+                callback(bool(grant))
+
+            def failed(ex):
+                self.logger.warning("Unable to obtain %s: %s" % (id, ex))
+                callback(False)
+
+            self.logger.debug('Attempting to obtain %s' % id)
+            self._authagent.ObtainAuthorization(id, dbus.UInt32(0), dbus.UInt32(os.getpid()), timeout=300,
+                                                reply_handler=obtained, error_handler=failed)
+
+        if self.authorizations.get(id):
+            callback(True)
+        elif id in self.requirements:
+            obtain(self.requirements[id])
+        else:
+            self._polkit.IsProcessAuthorized(id, dbus.UInt32(os.getpid()), False,
+                                             reply_handler=lambda res: self.__on_checked(id, res, obtain),
+                                             error_handler=lambda ex: obtain(""))
+
+    def __call(self, iface, method, done, *args):
+        """ Call a backend method. Blocking and returning its reply without done,
+            else done(success) is called once it replies """
+
+        if done is None:
+            return getattr(iface, method)(*args)
+
+        def failed(ex):
+            self.logger.warning("%s failed: %s" % (method, ex))
+            done(False)
+
+        getattr(iface, method)(*args, reply_handler=lambda *reply: done(True), error_handler=failed)
+
+    def __forget(self, id):
+        self.logger.info("Cached authorization for %s was refused, asking again" % id)
+        self.authorizations.drop(id)
+        self.requirements.pop(id, None)
+
+    def __authorized_call(self, id, iface, method, done):
+        """ __call() once the PolicyKit action id is authorized. A refused call
+            on a cached grant drops it and is authorized and tried once more """
+
+        cached = self.authorizations.get(id)
+
+        if done is None:
+            if not self.__auth_perms(id):
+                return False
+            try:
+                return self.__call(iface, method, None)
+            except dbus.DBusException as ex:
+                if not cached or ex.get_dbus_name() not in AUTH_ERRORS:
+                    raise
+                self.__forget(id)
+                if not self.__auth_perms(id):
+                    return False
+                return self.__call(iface, method, None)
+
+        def call(retry):
+            def failed(ex):
+                if retry and ex.get_dbus_name() in AUTH_ERRORS:
+                    self.__forget(id)
+                    self.__authorize(id, lambda ok: authorized(ok, False))
+                    return
+                self.logger.warning("%s failed: %s" % (method, ex))
+                done(False)
+
+            getattr(iface, method)(reply_handler=lambda *reply: done(True), error_handler=failed)
+
+        def authorized(ok, retry):
+            if ok:
+                call(retry)
+            else:
+                self.logger.warning("Not authorised to use %s" % id)
+                done(False)
+
+        self.__authorize(id, lambda ok: authorized(ok, cached))
 
     def __get_sessions(self):
         """ Using DBus and ConsoleKit, get the number of sessions. This is used by PolicyKit to dictate the
             multiple sessions permissions for the various reboot/shutdown commands """
 
-        # Check the number of active sessions
-        cnt = 0
-        seats = self._consolekit.GetSeats ()
-        for sid in seats:
-            seat_obj = dbus.SystemBus().get_object ('org.freedesktop.ConsoleKit', sid)
-            seat = dbus.Interface (seat_obj, 'org.freedesktop.ConsoleKit.Seat')
-            cnt += len(seat.GetSessions())
-
+        cnt = self.sessions.count()
+        if cnt is None:
+            # Unknown, go for the stricter multiple sessions policy
+            return 2
         return cnt
 
     def check(self):
@@ -152,96 +639,209 @@ class DbusController (object):
          except dbus.DBusException as ex:
             print("No .service files for ConsoleKit or UPower, fallbacking to none")
             return False
+       elif self.backend == "logind":
+         try:
+            self._sysbus.get_object ("org.freedesktop.login1", "/org/freedesktop/login1")
+            return True
+         except dbus.DBusException as ex:
+            print("logind is not running, fallbacking to none")
+            return False
 
        return False
 
     def check_ability(self, action):
         """Check if HAL can complete action type requests, for example, suspend, hiberate, and safesuspend"""
 
-        if self.backend == "HAL":
-           if action == 'suspend':
-               return self._halpm.CanSuspend
-           elif action == 'hibernate':
-               return self._halpm.CanHibernate
-           elif action == 'safesuspend':
-               if not self._halpm.CanHibernate or not self._halpm.CanSuspend:
-                  return False
-        elif self.backend == "ConsoleKit":
-           if action == 'suspend':
-              return self._upower.CanSuspend
-           elif action == 'hibernate':
-              return self._upower.CanHibernate
-           elif action == 'safesuspend':
-              if not self._upower.CanHibernate or not self._upower.CanSuspend:
-                 return False
+        calls = ABILITY_CALLS.get(self.backend, {})
+        for query in ABILITY_QUERIES.get(self.backend, {}).get(action, ()):
+            if not ability_value(self._sysbus.call_blocking(*calls[query])):
+                return False
 
         return True
 
-    def restart(self):
+    def probe(self, actions, on_ability, on_unavailable=None, ttl=ABILITY_TTL, on_finished=None):
+        """ Find out which actions the backend can perform without blocking. All the
+            queries are sent at once and on_ability(action, able) is called as each
+            answer comes in; on_unavailable() is called if one of the backend's
+            services is missing and on_finished() once every answer is in.
+            Results are cached for the session for ttl seconds """
+
+        calls = ABILITY_CALLS.get(self.backend, {})
+        pending = {}
+        for action in actions:
+            queries = ABILITY_QUERIES.get(self.backend, {}).get(action, ())
+            if queries:
+                pending[action] = queries
+
+        cached = load_ability_cache(self.backend, ttl)
+        if cached is not None:
+            available, results = cached
+            if not available:
+                if on_unavailable:
+                    on_unavailable()
+                if on_finished:
+                    on_finished()
+                return
+        else:
+            results = {}
+
+        state = {'available': True, 'failed': False}
+        queries = set(q for action in pending for q in pending[action])
+        services = SERVICES.get(self.backend, ())
+        # The services are always asked for, the actions go to them whatever the buttons
+        missing = set(q for q in queries if q not in results) | set(services)
+
+        def resolve():
+            if not state['available']:
+                return
+            for action, needed in list(pending.items()):
+                if all(q in results for q in needed):
+                    del pending[action]
+                    on_ability(action, all(results[q] for q in needed))
+
+        def finished(query):
+            missing.discard(query)
+            if missing:
+                return
+            if state['available'] and not state['failed']:
+                save_ability_cache(self.backend, True, results)
+            if on_finished:
+                on_finished()
+
+        def unavailable(ex):
+            if state['available']:
+                state['available'] = False
+                self.logger.info("Backend %s is not available: %s" % (self.backend, ex))
+                save_ability_cache(self.backend, False, {})
+                if on_unavailable:
+                    on_unavailable()
+
+        def reply(value, query):
+            self.logger.debug("Ability %s: %s" % (query, value))
+            results[query] = ability_value(value)
+            finished(query)
+            resolve()
+
+        def error(ex, query):
+            if ex.get_dbus_name() in UNAVAILABLE_ERRORS:
+                unavailable(ex)
+            else:
+                # Unknown answer, leave the action enabled and don't cache it
+                self.logger.debug("Unable to query %s: %s" % (query, ex))
+                state['failed'] = True
+                results[query] = True
+                resolve()
+            finished(query)
+
+        def unreachable(ex, name):
+            if ex.get_dbus_name() in UNAVAILABLE_ERRORS:
+                unavailable(ex)
+            else:
+                self.logger.debug("Unable to check %s: %s" % (name, ex))
+                state['failed'] = True
+            finished(name)
+
+        resolve()
+        for name in services:
+            # Like check(), a service that can be activated counts as there
+            self._sysbus.call_async("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                                    "StartServiceByName", "su", (name, dbus.UInt32(0)),
+                                    reply_handler=lambda started, n=name: finished(n),
+                                    error_handler=lambda ex, n=name: unreachable(ex, n))
+        for query in missing.difference(services):
+            self._sysbus.call_async(*calls[query],
+                                    reply_handler=lambda value, q=query: reply(value, q),
+                                    error_handler=lambda ex, q=query: error(ex, q))
+
+    # The actions block and return the reply when called without done, else
+    # they return at once and call done(success) when finished. Passing done
+    # lets the main loop run while PolicyKit asks for a password.
+
+    def restart(self, done=None):
         """Restart the system via HAL, if we do not have permissions to do so obtain them via PolicyKit"""
 
         if self.backend == "HAL":
            if self.__get_sessions() > 1:
-               if not self.__auth_perms("org.freedesktop.hal.power-management.reboot-multiple-sessions"):
-                   return False
+               id = "org.freedesktop.hal.power-management.reboot-multiple-sessions"
            else:
-               if not self.__auth_perms("org.freedesktop.hal.power-management.reboot"):
-                   return False
+               id = "org.freedesktop.hal.power-management.reboot"
 
            self.logger.debug("Rebooting...")
-           return self._halpm.Reboot()
+           return self.__authorized_call(id, self._halpm, "Reboot", done)
         elif self.backend == "ConsoleKit":
            self.logger.debug("Rebooting...")
-           return self._consolekit.Restart()
+           return self.__call(self._consolekit, "Restart", done)
+        elif self.backend == "logind":
+           self.logger.debug("Rebooting...")
+           # Interactive, so polkit may ask for a password when required
+           return self.__call(self._logind, "Reboot", done, True)
 
-        return False
+        return self.__unsupported(done)
 
-    def shutdown(self):
+    def shutdown(self, done=None):
         """Shutdown the system via HAL, if we do not have permissions to do so obtain them via PolicyKit"""
 
         if self.backend == "HAL":
            if self.__get_sessions() > 1:
-               if not self.__auth_perms("org.freedesktop.hal.power-management.shutdown-multiple-sessions"):
-                   return False
+               id = "org.freedesktop.hal.power-management.shutdown-multiple-sessions"
            else:
-               if not self.__auth_perms("org.freedesktop.hal.power-management.shutdown"):
-                   return False
+               id = "org.freedesktop.hal.power-management.shutdown"
+
            self.logger.debug("Shutdown...")
-           return self._halpm.Shutdown()
+           return self.__authorized_call(id, self._halpm, "Shutdown", done)
         elif self.backend == "ConsoleKit":
            self.logger.debug("Shutdown...")
-           return self._consolekit.Stop()
+           return self.__call(self._consolekit, "Stop", done)
+        elif self.backend == "logind":
+           self.logger.debug("Shutdown...")
+           return self.__call(self._logind, "PowerOff", done, True)
 
-        return False
+        return self.__unsupported(done)
 
-    def suspend(self):
+    def suspend(self, done=None):
         if self.backend == "HAL":
-           if not self.__auth_perms("org.freedesktop.hal.power-management.suspend"):
-               return False
-           else:
-               return self._halpm.Suspend()
+           return self.__authorized_call("org.freedesktop.hal.power-management.suspend", self._halpm, "Suspend", done)
         elif self.backend == "ConsoleKit":
-           return self._upower.Suspend()
+           return self.__call(self._upower, "Suspend", done)
+        elif self.backend == "logind":
+           return self.__call(self._logind, "Suspend", done, True)
 
-        return False
+        return self.__unsupported(done)
 
-    def hibernate(self):
+    def hibernate(self, done=None):
         if self.backend == "HAL":
-           if not self.__auth_perms("org.freedesktop.hal.power-management.hibernate"):
-               return False
-           else:
-               return self._halpm.Hibernate()
+           return self.__authorized_call("org.freedesktop.hal.power-management.hibernate", self._halpm, "Hibernate", done)
         elif self.backend == "ConsoleKit":
-           return self._upower.Hibernate()
+           return self.__call(self._upower, "Hibernate", done)
+        elif self.backend == "logind":
+           return self.__call(self._logind, "Hibernate", done, True)
 
-        return False
+        return self.__unsupported(done)
 
-    def safesuspend(self):
-        pass
+    def safesuspend(self, done=None):
+        if self.backend == "logind":
+           return self.__call(self._logind, "HybridSleep", done, True)
+
+        return self.__unsupported(done)
+
+    def lock(self, done=None):
+        """ Ask logind to lock the sessions, a locker such as xss-lock has to act on it """
+        if self.backend == "logind":
+           return self.__call(self._logind, "LockSessions", done)
+
+        return self.__unsupported(done)
+
+    def __unsupported(self, done):
+        if done is not None:
+            done(False)
+        return False
 
 if __name__ == "__main__":
 
+    # Only queries, see oblogout.mockbus to exercise the actions on a private bus
     logging.basicConfig(level=logging.DEBUG)
 
-    t = DbusController(None)
-    print(t.restart())
+    for backend in ("HAL", "ConsoleKit", "logind"):
+        t = DbusController(backend)
+        if t.check():
+            print("%s: %s" % (backend, dict((action, t.check_ability(action)) for action in ABILITY_QUERIES[backend])))
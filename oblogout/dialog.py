@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Dialog widgets from the GtkBuilder template dialog.ui, styled by the
+# stylesheet dialog.css. A button theme can restyle the dialog with a
+# style.css in its directory, which is loaded over the defaults, so colours,
+# hover effects and padding need no code changes.
+#
+# The template's button box is copied into the panel once per configured
+# button, so the whole dialog is a single GtkBuilder parse.
+
+import os
+import copy
+import logging
+import xml.etree.ElementTree as ET
+
+from gi.repository import Gtk
+from gi.repository import GLib
+
+UI_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dialog.ui")
+CSS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dialog.css")
+
+# Stylesheet of a button theme, in the theme directory
+THEME_CSS = "style.css"
+
+logger = logging.getLogger("Dialog")
+
+# Template source, the panels generated from it and the providers, loaded
+# once per process
+_template = None
+_panels = {}
+_providers = {}
+
+def template():
+    global _template
+
+    if _template is None:
+        with open(UI_FILE) as f:
+            _template = f.read()
+    return _template
+
+def button_id(obj, name):
+    """ Id of the template object obj in the button box of name, "image-logout" """
+    return "%s-%s" % (obj, name)
+
+def panel_ui(names):
+    """ Interface description of the panel with a button box for each of names,
+        the objects of each box are named with button_id """
+
+    names = tuple(names)
+    ui = _panels.get(names)
+    if ui is None:
+        root = ET.fromstring(template())
+        buttonbox = root.find("object[@id='buttonbox']")
+        root.remove(buttonbox)
+        buttonpanel = root.find(".//object[@id='buttonpanel']")
+
+        for name in names:
+            child = ET.SubElement(buttonpanel, "child")
+            box = copy.deepcopy(buttonbox)
+            for obj in box.iter("object"):
+                obj.set("id", button_id(obj.get("id"), name))
+            child.append(box)
+            packing = ET.SubElement(child, "packing")
+            for prop in ("expand", "fill"):
+                ET.SubElement(packing, "property", name=prop).text = "False"
+
+        ui = _panels[names] = ET.tostring(root, encoding="unicode")
+    return ui
+
+def build_panel(names):
+    """ Build the panel with the buttons names, returns the builder """
+
+    builder = Gtk.Builder()
+    builder.add_from_string(panel_ui(names))
+    return builder
+
+def _provider(path):
+    provider = _providers.get(path)
+    if provider is None:
+        provider = Gtk.CssProvider()
+        provider.load_from_path(path)
+        _providers[path] = provider
+    return provider
+
+def add_styles(screen, theme_path=None):
+    """ Style the dialog on screen, with the stylesheet of the theme in theme_path if it has one """
+
+    priority = Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+    Gtk.StyleContext.add_provider_for_screen(screen, _provider(CSS_FILE), priority)
+
+    if theme_path is None:
+        return
+    path = os.path.join(theme_path, THEME_CSS)
+    if not os.path.isfile(path):
+        return
+
+    try:
+        provider = _provider(path)
+    except GLib.Error as ex:
+        logger.error("Unable to load %s: %s" % (path, ex))
+        return
+    Gtk.StyleContext.add_provider_for_screen(screen, provider, priority + 1)
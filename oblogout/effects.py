@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Background effects for the non-composited path, set with [looks] effect.
+# Effects run in the given order and the fade to the configured opacity is
+# always applied last, "dim" alone meaning no extra effect. The dialog does
+# that fade when painting the result, see render.Background.dim. Every stage works
+# on whole buffers in C: blur is a downscale/upscale through GdkPixbuf's
+# filtering, desaturate is gdk_pixbuf_saturate_and_pixelate.
+#
+# The chain is first timed on a small sample of the grab; if the full size
+# estimate goes over the budget, only the fade is applied.
+
+import time
+import logging
+
+from gi.repository import GdkPixbuf
+
+from .fade import fade_pixbuf
+
+# Downscale factor of the blur, higher is blurrier and cheaper
+BLUR_SCALE = 8
+
+# The sample is this many times smaller than the grab on each side
+SAMPLE_SCALE = 4
+
+DEFAULT_BUDGET = 50
+
+logger = logging.getLogger("Effects")
+
+def blur(pixbuf):
+    width, height = pixbuf.get_width(), pixbuf.get_height()
+    small = pixbuf.scale_simple(max(1, width // BLUR_SCALE), max(1, height // BLUR_SCALE),
+                                GdkPixbuf.InterpType.BILINEAR)
+    return small.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+
+def desaturate(pixbuf):
+    grey = pixbuf.copy()
+    pixbuf.saturate_and_pixelate(grey, 0.0, False)
+    return grey
+
+EFFECTS = {
+    'blur': blur,
+    'desaturate': desaturate,
+}
+
+def run_chain(pixbuf, effects, opacity, fade=True):
+    for name in effects:
+        pixbuf = EFFECTS[name](pixbuf)
+    if fade:
+        pixbuf = fade_pixbuf(pixbuf, opacity)
+    return pixbuf
+
+def estimate(pixbuf, effects, opacity, fade=True):
+    """ Estimated ms for the chain on pixbuf, from a run on a reduced copy """
+
+    width, height = pixbuf.get_width(), pixbuf.get_height()
+    sample = pixbuf.scale_simple(max(1, width // SAMPLE_SCALE), max(1, height // SAMPLE_SCALE),
+                                 GdkPixbuf.InterpType.NEAREST)
+    start = time.perf_counter()
+    run_chain(sample, effects, opacity, fade)
+    return (time.perf_counter() - start) * 1000 * SAMPLE_SCALE * SAMPLE_SCALE
+
+def apply_effects(pixbuf, effects, opacity, budget=DEFAULT_BUDGET, fade=True):
+    """ Run effects then the fade on pixbuf, falling back to the fade alone
+        when the chain would take longer than budget ms. Without fade the
+        caller dims the result itself, and pixbuf is returned as is when
+        there are no effects """
+
+    if effects and budget:
+        cost = estimate(pixbuf, effects, opacity, fade)
+        if cost > budget:
+            logger.info("Effects %s would take %.0f ms, over the %s ms budget, only dimming"
+                        % (", ".join(effects), cost, budget))
+            effects = []
+
+    return run_chain(pixbuf, effects, opacity, fade)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Non-blocking action execution. Commands are spawned directly (a shell is
+# only used when the command line needs one) and reaped with GLib child
+# watches, so the main loop keeps running while they work.
+#
+# Ordering policy: a step may name another step it runs after, either once
+# that step has started (STARTED, e.g. the lock before a suspend) or once it
+# has exited (EXITED). Steps without a dependency are started together. A
+# dependency that was never queued or failed to start doesn't block.
+#
+# Callables are asynchronous: they are passed a done(success) callback and
+# their step has exited once it has been called, which may be later from the
+# main loop (e.g. after a PolicyKit prompt).
+#
+# Timeouts apply to both: a command is sent SIGTERM, then SIGKILL if it is
+# still running KILL_GRACE seconds later, and a call that hasn't answered in
+# time is failed, its late done() being ignored.
+
+import os
+import re
+import shlex
+import signal
+import logging
+import subprocess
+
+from gi.repository import GLib
+
+from .timing import mark
+
+STARTED = "started"
+EXITED = "exited"
+FAILED = "failed"
+
+# Seconds between SIGTERM and SIGKILL for a command that timed out
+KILL_GRACE = 5
+
+# Anything beyond plain words and quoting needs /bin/sh
+_SHELL_SYNTAX = re.compile(r"[|&;<>()$`*?\[\]~{}\n\\]|^\s*\w+=")
+
+def split_command(cmdline):
+    """ argv for a configured command line, going through the shell only when needed """
+
+    if _SHELL_SYNTAX.search(cmdline):
+        return ["/bin/sh", "-c", cmdline]
+    try:
+        return shlex.split(cmdline)
+    except ValueError:
+        return ["/bin/sh", "-c", cmdline]
+
+class Step(object):
+
+    def __init__(self, name, action, timeout=None, after=None, when=STARTED):
+        self.name = name
+        self.action = action
+        self.timeout = timeout
+        self.after = after
+        self.when = when
+
+class ActionExecutor(object):
+
+    """ ActionExecutor runs a set of steps, each a command line or a callable,
+        following their ordering and enforcing per-step timeouts """
+
+    def __init__(self, on_idle=None, wait_children=False):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.on_idle = on_idle
+        # The dialog quits once everything is started, oblogout --action
+        # waits for the commands to report their exit status
+        self.wait_children = wait_children
+        self.queued = []
+        self.state = {}
+        self.children = {}
+        self.calls = set()
+        # Keyed by pid for commands and by step name for calls
+        self.timers = {}
+        self.scheduling = False
+
+    def add(self, name, action, timeout=None, after=None, when=STARTED):
+        """ Queue a step, action being a command line or a callable run in the
+            main loop as action(done) """
+
+        if not action:
+            self.logger.debug("No command for %s, skipping" % name)
+            return
+        self.queued.append(Step(name, action, timeout, after, when))
+
+    def start(self):
+        self.__schedule()
+
+    def idle(self):
+        """ Nothing left to start, no call pending and no timeout to enforce, and
+            no command running when waiting for them """
+        if self.wait_children and self.children:
+            return False
+        return not self.queued and not self.calls and not self.timers
+
+    def __reached(self, name, when):
+        if name is None or name not in self.state:
+            return not any(step.name == name for step in self.queued)
+        if when == EXITED:
+            return self.state[name] in (EXITED, FAILED)
+        return True
+
+    def __schedule(self):
+        self.scheduling = True
+        try:
+            while True:
+                ready = [step for step in self.queued if self.__reached(step.after, step.when)]
+                if not ready:
+                    break
+                for step in ready:
+                    self.queued.remove(step)
+                    self.__run(step)
+        finally:
+            self.scheduling = False
+
+        if self.idle() and self.on_idle:
+            on_idle, self.on_idle = self.on_idle, None
+            on_idle()
+
+    def __run(self, step):
+        if callable(step.action):
+            self.logger.debug("Running %s" % step.name)
+            mark("call", step=step.name)
+            self.state[step.name] = STARTED
+            self.calls.add(step.name)
+            if step.timeout:
+                self.timers[step.name] = GLib.timeout_add(int(step.timeout * 1000), self.__on_call_timeout, step)
+            try:
+                step.action(lambda success, step=step: self.__on_done(step, success))
+            except Exception as ex:
+                self.logger.warning("%s failed: %s" % (step.name, ex))
+                self.__on_done(step, False)
+            return
+
+        argv = split_command(step.action)
+        self.logger.debug("Executing command: %s" % argv)
+        try:
+            child = subprocess.Popen(argv, stdin=subprocess.DEVNULL, start_new_session=True)
+        except OSError as ex:
+            self.logger.warning("Unable to run %s: %s" % (step.action, ex))
+            self.state[step.name] = FAILED
+            return
+
+        self.state[step.name] = STARTED
+        mark("spawned", step=step.name, pid=child.pid)
+        self.children[child.pid] = (step, child)
+        GLib.child_watch_add(GLib.PRIORITY_DEFAULT, child.pid, self.__on_exit)
+
+        if step.timeout:
+            self.timers[child.pid] = GLib.timeout_add(int(step.timeout * 1000), self.__on_timeout, child.pid)
+
+    def __on_done(self, step, success):
+        if step.name not in self.calls:
+            return
+        self.calls.discard(step.name)
+        timer = self.timers.pop(step.name, None)
+        if timer is not None:
+            GLib.source_remove(timer)
+        self.state[step.name] = EXITED if success else FAILED
+        mark("done", step=step.name, success=bool(success))
+        self.logger.debug("%s done, success: %s" % (step.name, bool(success)))
+
+        # Called from within __run, the running schedule picks it up
+        if not self.scheduling:
+            self.__schedule()
+
+    def __on_exit(self, pid, status):
+        step, child = self.children.pop(pid)
+        # GLib reaped the child, keep Popen from waiting on it again
+        child.returncode = status
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            self.state[step.name] = EXITED
+        else:
+            self.logger.warning("%s failed with wait status %d" % (step.name, status))
+            self.state[step.name] = FAILED
+        mark("exited", step=step.name, status=status)
+        self.logger.debug("%s exited with status %d" % (step.name, status))
+
+        timer = self.timers.pop(pid, None)
+        if timer is not None:
+            GLib.source_remove(timer)
+
+        self.__schedule()
+
+    def __on_timeout(self, pid):
+        step, child = self.children[pid]
+        del self.timers[pid]
+        self.logger.warning("%s timed out after %ss, terminating" % (step.name, step.timeout))
+        try:
+            os.killpg(pid, signal.SIGTERM)
+        except OSError:
+            pass
+        self.timers[pid] = GLib.timeout_add(KILL_GRACE * 1000, self.__on_kill, pid)
+
+        self.__schedule()
+        return False
+
+    def __on_kill(self, pid):
+        del self.timers[pid]
+        if pid in self.children:
+            step, child = self.children[pid]
+            self.logger.warning("%s ignored SIGTERM, killing" % step.name)
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+        self.__schedule()
+        return False
+
+    def __on_call_timeout(self, step):
+        del self.timers[step.name]
+        self.logger.warning("%s timed out after %ss" % (step.name, step.timeout))
+        self.__on_done(step, False)
+        return False
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Pixbuf fade through a 256 entry lookup table. The dialog doesn't use it: it
+# dims its background with cairo while painting it into the window's surface
+# (render.Background). fade_pixbuf is only kept for effects.apply_effects with
+# fade=True, which returns a faded pixbuf, and benchmark() times the dialog's
+# cairo path against the original PIL and PPM round trip.
+
+import os
+
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+def fade_table(opacity):
+    """ Lookup table mapping a channel value to its faded value """
+    return bytes((p * opacity) // 255 for p in range(256))
+
+def fade_bytes(data, opacity, n_channels=3, has_alpha=False):
+    """ Fade a raw pixel buffer. Row padding is faded along with the pixels,
+        which is harmless, but the alpha channel is kept untouched """
+
+    table = fade_table(opacity)
+    if not has_alpha:
+        return data.translate(table)
+
+    # RGBA rows are never padded, so every n_channels-th byte is alpha
+    faded = bytearray(data).translate(table)
+    faded[n_channels - 1::n_channels] = data[n_channels - 1::n_channels]
+    return bytes(faded)
+
+def fade_pixbuf(pixbuf, opacity):
+    """ Return a faded copy of pixbuf, keeping its rowstride and alpha channel """
+
+    faded = fade_bytes(pixbuf.read_pixel_bytes().get_data(), opacity,
+                       pixbuf.get_n_channels(), pixbuf.get_has_alpha())
+
+    return GdkPixbuf.Pixbuf.new_from_bytes(GLib.Bytes.new(faded),
+                                           pixbuf.get_colorspace(),
+                                           pixbuf.get_has_alpha(),
+                                           pixbuf.get_bits_per_sample(),
+                                           pixbuf.get_width(),
+                                           pixbuf.get_height(),
+                                           pixbuf.get_rowstride())
+
+def fade_pixbuf_pil(pixbuf, opacity):
+    """ The original PIL based fade, kept for benchmarking. It assumes a packed
+        RGB buffer and breaks on padded rows or an alpha channel """
+
+    import io
+    from PIL import Image
+
+    wh = (pixbuf.get_width(), pixbuf.get_height())
+    pilimg = Image.frombytes("RGB", wh, pixbuf.get_pixels())
+    pilimg = pilimg.point(lambda p: ((p * opacity) // 255 ))
+
+    buf = io.BytesIO()
+    pilimg.save(buf, "ppm")
+    del pilimg
+    loader = GdkPixbuf.PixbufLoader.new_with_type("pnm")
+    loader.write(buf.getvalue())
+    loader.close()
+    buf.close()
+    return loader.get_pixbuf()
+
+def fade_cairo(pixbuf, opacity):
+    """ The dialog's path: the grab painted into a surface and dimmed there """
+
+    from .render import Background
+
+    background = Background(None, opacity)
+    background.set_pixbuf(pixbuf, None)
+    return background.surface
+
+def benchmark(resolutions=((1920, 1080), (2560, 1440), (3840, 2160)), opacity=70, repeat=5):
+    """ Time the dialog's fade against the PIL one on synthetic screen grabs,
+        best of `repeat` runs in ms. The lookup table is timed as well """
+
+    import time
+
+    engines = [("cairo", fade_cairo), ("lut", fade_pixbuf)]
+    try:
+        import PIL
+        engines.append(("pil", fade_pixbuf_pil))
+    except ImportError:
+        pass
+
+    results = []
+    for width, height in resolutions:
+        # Same layout as a root window grab: packed 8 bit RGB, no alpha
+        rowstride = width * 3
+        data = GLib.Bytes.new(os.urandom(rowstride * height))
+        pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB,
+                                                 False, 8, width, height, rowstride)
+        for name, engine in engines:
+            timings = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                engine(pixbuf, opacity)
+                timings.append((time.perf_counter() - start) * 1000)
+            results.append((name, width, height, min(timings)))
+
+    return results
+
+if __name__ == "__main__":
+
+    for name, width, height, ms in benchmark():
+        print("%-5s %5dx%-5d %8.1f ms" % (name, width, height, ms))
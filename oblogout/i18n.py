@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Translations. Modules import _ from here instead of relying on
+# gettext.install(). The catalog is only looked up on the first translated
+# string, not at all for the C locale, and every translation is memoised.
+# In local mode the po/*.po file for the locale is compiled in memory.
+
+import os
+import sys
+import gettext
+import logging
+
+DOMAIN = "oblogout"
+
+logger = logging.getLogger("i18n")
+
+_local_mode = False
+_localedir = None
+_translation = None
+_cache = {}
+
+def setup(local=False, localedir=None):
+    """ Choose where catalogs come from, takes effect on the next lookup """
+
+    global _local_mode, _localedir, _translation
+    _local_mode = bool(local)
+    _localedir = localedir
+    _translation = None
+    _cache.clear()
+
+def languages():
+    """ Languages asked for by the environment, in gettext's order. Empty for C """
+
+    for var in ('LANGUAGE', 'LC_ALL', 'LC_MESSAGES', 'LANG'):
+        value = os.environ.get(var)
+        if value:
+            langs = [lang for lang in value.split(":") if lang not in ("C", "POSIX") and not lang.startswith("C.")]
+            return langs
+    return []
+
+def _expand(lang):
+    """ de_DE.UTF-8@euro -> de_DE@euro, de_DE, de """
+
+    lang, sep, modifier = lang.partition("@")
+    lang = lang.split(".")[0]
+
+    candidates = [lang]
+    if modifier:
+        candidates.insert(0, "%s@%s" % (lang, modifier))
+    if "_" in lang:
+        candidates.append(lang.split("_")[0])
+    return candidates
+
+def _unquote(line):
+    """ Value of a quoted po string """
+    return line[line.index('"') + 1:line.rindex('"')].encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+def parse_po(path):
+    """ Compile a .po file into a msgid -> msgstr dict, skipping fuzzy and untranslated entries """
+
+    catalog = {}
+    entry = {}
+    field = None
+    fuzzy = False
+
+    def complete():
+        return any(key.startswith("msgstr") for key in entry)
+
+    def flush():
+        msgid = entry.get('msgid')
+        msgstr = entry.get('msgstr') or entry.get('msgstr[0]')
+        if msgid and msgstr and not fuzzy:
+            if 'msgctxt' in entry:
+                msgid = "%s\x04%s" % (entry['msgctxt'], msgid)
+            catalog[msgid] = msgstr
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith("#"):
+                # Comments open the next entry, flags included
+                if complete():
+                    flush()
+                    entry, field, fuzzy = {}, None, False
+                if line.startswith("#,") and "fuzzy" in line:
+                    fuzzy = True
+                continue
+
+            if line.startswith('"'):
+                if field:
+                    entry[field] += _unquote(line)
+                continue
+
+            keyword = line.split(None, 1)[0]
+            if keyword in ("msgctxt", "msgid") and complete():
+                flush()
+                entry, fuzzy = {}, False
+            field = keyword
+            entry[field] = _unquote(line)
+
+    if complete():
+        flush()
+    return catalog
+
+class CatalogTranslations(gettext.NullTranslations):
+
+    """ Translations served from a dict compiled from a .po file """
+
+    def __init__(self, catalog):
+        gettext.NullTranslations.__init__(self)
+        self._catalog = catalog
+
+    def gettext(self, message):
+        return self._catalog.get(message, message)
+
+def _local_translation(langs):
+    podir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "po")
+    for lang in langs:
+        for candidate in _expand(lang):
+            path = os.path.join(podir, "%s.po" % candidate)
+            if os.path.exists(path):
+                logger.debug("Compiling %s" % path)
+                return CatalogTranslations(parse_po(path))
+    return gettext.NullTranslations()
+
+def translation():
+    """ The translations for the current locale, loaded on first use """
+
+    global _translation
+    if _translation is None:
+        langs = languages()
+        if not langs:
+            _translation = gettext.NullTranslations()
+        elif _local_mode:
+            _translation = _local_translation(langs)
+        else:
+            _translation = gettext.translation(DOMAIN, _localedir or "%s/share/locale" % sys.prefix,
+                                               languages=langs, fallback=True)
+    return _translation
+
+def _(message):
+    """ Translate message, memoised """
+    try:
+        return _cache[message]
+    except KeyError:
+        translated = _cache[message] = translation().gettext(message)
+        return translated
+
+def N_(message):
+    """ Mark message for translation where it is defined, it is translated with
+        _() where it is shown. xgettext has to be run with --keyword=N_ """
+    return message
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Decoded icon cache. Button icons are stored as raw RGBA under
+# $XDG_CACHE_HOME/oblogout/<theme>/ and mapped back into a pixbuf on the next
+# start, so PNG/SVG decoding only happens when a theme file changes.
+
+import os
+import struct
+import hashlib
+import logging
+
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+# magic, source mtime (ns), width, height, rowstride
+HEADER = struct.Struct("<4sQIII")
+MAGIC = b"OBI1"
+
+def cache_home():
+    return os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+class IconCache(object):
+
+    """ IconCache loads theme icons as pixbufs, rasterized for a given scale
+        factor, and keeps their decoded pixels on disk """
+
+    def __init__(self, theme, scale=1):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.scale = scale
+        self.path = os.path.join(cache_home(), "oblogout", theme)
+
+    def __entry(self, filename):
+        key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()
+        return os.path.join(self.path, "%s@%dx.rgba" % (key, self.scale))
+
+    def __read(self, entry, mtime):
+        """ Map a cache entry, returns None when missing or stale """
+
+        try:
+            with open(entry, "rb") as f:
+                magic, cached_mtime, width, height, rowstride = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+
+        if magic != MAGIC or cached_mtime != mtime:
+            return None
+
+        try:
+            mapped = GLib.MappedFile.new(entry, False)
+        except GLib.Error:
+            return None
+
+        size = rowstride * height
+        data = mapped.get_bytes()
+        if data.get_size() != HEADER.size + size:
+            return None
+
+        pixels = GLib.Bytes.new_from_bytes(data, HEADER.size, size)
+        return GdkPixbuf.Pixbuf.new_from_bytes(pixels, GdkPixbuf.Colorspace.RGB,
+                                               True, 8, width, height, rowstride)
+
+    def __write(self, entry, mtime, pixbuf):
+        tmp = "%s.%d" % (entry, os.getpid())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, mtime, pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_rowstride()))
+                f.write(pixbuf.read_pixel_bytes().get_data())
+            os.replace(tmp, entry)
+        except OSError as ex:
+            # A read-only cache only costs us the decoding next time
+            self.logger.debug("Unable to cache %s: %s" % (entry, ex))
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def __decode(self, filename):
+        """ Decode an icon at its natural size times the scale factor, always with alpha """
+
+        if self.scale == 1:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename)
+        else:
+            info, width, height = GdkPixbuf.Pixbuf.get_file_info(filename)
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(filename, width * self.scale, height * self.scale, True)
+
+        if not pixbuf.get_has_alpha():
+            pixbuf = pixbuf.add_alpha(False, 0, 0, 0)
+        return pixbuf
+
+    def load(self, filename, mtime=None):
+        """ Return the pixbuf for filename, from the cache when it is up to date.
+            mtime saves the stat when already known, e.g. from the theme manifest """
+
+        if mtime is None:
+            mtime = os.stat(filename).st_mtime_ns
+        entry = self.__entry(filename)
+
+        pixbuf = self.__read(entry, mtime)
+        if pixbuf is not None:
+            return pixbuf
+
+        self.logger.debug("Icon cache miss for %s" % filename)
+        pixbuf = self.__decode(filename)
+        self.__write(entry, mtime, pixbuf)
+        return pixbuf
@@ -0,0 +1,551 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Mock D-Bus services for DbusController, run from the source tree with
+#
+#   python -m oblogout.mockbus [--latency 5] [--seats 8] [--sessions 2]
+#                              [--polkit yes] [--repeat 5] [--output FILE]
+#
+# A private dbus-daemon is started and used as both the system and the
+# session bus, with stand-ins for HAL, ConsoleKit (manager and seats), UPower,
+# PolicyKit and its authentication agent, and logind, each answering after
+# --latency ms without blocking the others. A monitor on the bus counts every
+# method call the client makes, bus daemon calls included.
+#
+# The paths the dialog uses are then run against every backend on a GLib
+# main loop: probe(), warm_up() with its PolicyKit precheck and session count,
+# each action with a done callback, and for HAL a session added by signal.
+# Each is reported as JSON with its wall time and round trips, first call and
+# warm, and checked against the expected outcome and warm round trips; the
+# exit status is 1 when a check fails.
+
+import os
+import sys
+import json
+import time
+import getopt
+import shutil
+import tempfile
+import subprocess
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MOCK_NAME = "org.oblogout.Mock"
+MOCK_PATH = "/org/oblogout/Mock"
+
+NAMES = ("org.freedesktop.Hal", "org.freedesktop.ConsoleKit", "org.freedesktop.UPower",
+         "org.freedesktop.PolicyKit", "org.freedesktop.PolicyKit.AuthenticationAgent",
+         "org.freedesktop.login1", MOCK_NAME)
+
+ACTIONS = ("restart", "shutdown", "suspend", "hibernate", "safesuspend", "lock")
+
+# Actions each backend carries out, the others fail without a call
+SUPPORTED = {
+    'HAL': ("restart", "shutdown", "suspend", "hibernate"),
+    'ConsoleKit': ("restart", "shutdown", "suspend", "hibernate"),
+    'logind': ACTIONS,
+}
+
+def serve(address, latency, seats, sessions, polkit):
+    """ Run the stand-in services on the bus at address until killed """
+
+    import dbus
+    import dbus.service
+    import dbus.lowlevel
+    from dbus.mainloop.glib import DBusGMainLoop
+    from gi.repository import GLib
+
+    DBusGMainLoop(set_as_default=True)
+    ASYNC = {'async_callbacks': ("reply", "error")}
+    HAL_PM = "org.freedesktop.Hal.Device.SystemPowerManagement"
+    LOGIND = "org.freedesktop.login1.Manager"
+
+    class MockObject(dbus.service.Object):
+
+        def answer(self, reply, *value):
+            # Other calls are served while this one waits
+            GLib.timeout_add(latency, lambda: reply(*value) or False)
+
+    class Hal(MockObject):
+
+        @dbus.service.method("org.freedesktop.Hal.Device", in_signature="s", out_signature="b", **ASYNC)
+        def GetPropertyBoolean(self, name, reply, error):
+            self.answer(reply, True)
+
+        @dbus.service.method(HAL_PM, out_signature="i", **ASYNC)
+        def Reboot(self, reply, error):
+            self.answer(reply, 0)
+
+        @dbus.service.method(HAL_PM, out_signature="i", **ASYNC)
+        def Shutdown(self, reply, error):
+            self.answer(reply, 0)
+
+        @dbus.service.method(HAL_PM, out_signature="i", **ASYNC)
+        def Suspend(self, reply, error):
+            self.answer(reply, 0)
+
+        @dbus.service.method(HAL_PM, out_signature="i", **ASYNC)
+        def Hibernate(self, reply, error):
+            self.answer(reply, 0)
+
+    class ConsoleKitManager(MockObject):
+
+        @dbus.service.method("org.freedesktop.ConsoleKit.Manager", out_signature="ao", **ASYNC)
+        def GetSeats(self, reply, error):
+            self.answer(reply, [dbus.ObjectPath("/org/freedesktop/ConsoleKit/Seat%d" % i) for i in range(seats)])
+
+        @dbus.service.method("org.freedesktop.ConsoleKit.Manager", **ASYNC)
+        def Restart(self, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method("org.freedesktop.ConsoleKit.Manager", **ASYNC)
+        def Stop(self, reply, error):
+            self.answer(reply)
+
+    class ConsoleKitSeat(MockObject):
+
+        def __init__(self, conn, path):
+            MockObject.__init__(self, conn, path)
+            self.prefix = "/org/freedesktop/ConsoleKit/%sSession" % path.rsplit("/", 1)[-1]
+            self.sessions = [dbus.ObjectPath("%s%d" % (self.prefix, i)) for i in range(sessions)]
+
+        @dbus.service.method("org.freedesktop.ConsoleKit.Seat", out_signature="ao", **ASYNC)
+        def GetSessions(self, reply, error):
+            self.answer(reply, self.sessions)
+
+        @dbus.service.signal("org.freedesktop.ConsoleKit.Seat", signature="o")
+        def SessionAdded(self, ssid):
+            pass
+
+        def add_session(self):
+            ssid = dbus.ObjectPath("%s%d" % (self.prefix, len(self.sessions)))
+            self.sessions.append(ssid)
+            self.SessionAdded(ssid)
+
+    class UPower(MockObject):
+
+        @dbus.service.method("org.freedesktop.UPower", **ASYNC)
+        def Suspend(self, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method("org.freedesktop.UPower", **ASYNC)
+        def Hibernate(self, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method("org.freedesktop.DBus.Properties", in_signature="ss", out_signature="v", **ASYNC)
+        def Get(self, interface, name, reply, error):
+            self.answer(reply, True)
+
+    class PolicyKit(MockObject):
+
+        """ PolicyKit and its authentication agent, both at / on their buses """
+
+        @dbus.service.method("org.freedesktop.PolicyKit", in_signature="sub", out_signature="s", **ASYNC)
+        def IsProcessAuthorized(self, action, pid, revoke, reply, error):
+            self.answer(reply, polkit)
+
+        @dbus.service.method("org.freedesktop.PolicyKit.AuthenticationAgent", in_signature="suu",
+                             out_signature="b", **ASYNC)
+        def ObtainAuthorization(self, action, xid, pid, reply, error):
+            self.answer(reply, True)
+
+    class Logind(MockObject):
+
+        def can(self, reply):
+            self.answer(reply, "yes")
+
+        @dbus.service.method(LOGIND, out_signature="s", **ASYNC)
+        def CanPowerOff(self, reply, error):
+            self.can(reply)
+
+        @dbus.service.method(LOGIND, out_signature="s", **ASYNC)
+        def CanReboot(self, reply, error):
+            self.can(reply)
+
+        @dbus.service.method(LOGIND, out_signature="s", **ASYNC)
+        def CanSuspend(self, reply, error):
+            self.can(reply)
+
+        @dbus.service.method(LOGIND, out_signature="s", **ASYNC)
+        def CanHibernate(self, reply, error):
+            self.can(reply)
+
+        @dbus.service.method(LOGIND, out_signature="s", **ASYNC)
+        def CanHybridSleep(self, reply, error):
+            self.can(reply)
+
+        @dbus.service.method(LOGIND, in_signature="b", **ASYNC)
+        def Reboot(self, interactive, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method(LOGIND, in_signature="b", **ASYNC)
+        def PowerOff(self, interactive, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method(LOGIND, in_signature="b", **ASYNC)
+        def Suspend(self, interactive, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method(LOGIND, in_signature="b", **ASYNC)
+        def Hibernate(self, interactive, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method(LOGIND, in_signature="b", **ASYNC)
+        def HybridSleep(self, interactive, reply, error):
+            self.answer(reply)
+
+        @dbus.service.method(LOGIND, **ASYNC)
+        def LockSessions(self, reply, error):
+            self.answer(reply)
+
+    class Mock(dbus.service.Object):
+
+        """ Round trip counts, fed by the monitor connection """
+
+        def __init__(self, conn, path, seats):
+            dbus.service.Object.__init__(self, conn, path)
+            self.calls = {}
+            self.ignore = set()
+            self.seats = seats
+
+        def count(self, conn, message):
+            if message.get_type() == dbus.lowlevel.MESSAGE_TYPE_METHOD_CALL and message.get_interface() != MOCK_NAME \
+               and message.get_sender() not in self.ignore:
+                key = "%s.%s" % (message.get_interface(), message.get_member())
+                self.calls[key] = self.calls.get(key, 0) + 1
+
+        @dbus.service.method(MOCK_NAME, out_signature="a{su}", **ASYNC)
+        def Stats(self, reply, error):
+            # Let the monitor catch up with the calls made before this one
+            GLib.timeout_add(20, lambda: reply(self.calls) or False)
+
+        @dbus.service.method(MOCK_NAME, in_signature="s")
+        def Reset(self, sender):
+            self.calls = {}
+            self.ignore.add(sender)
+
+        @dbus.service.method(MOCK_NAME, in_signature="u")
+        def AddSession(self, seat):
+            self.seats[seat].add_session()
+
+    bus = dbus.bus.BusConnection(address)
+    names = [dbus.service.BusName(name, bus) for name in NAMES]
+
+    objects = [
+        Hal(bus, "/org/freedesktop/Hal/devices/computer"),
+        ConsoleKitManager(bus, "/org/freedesktop/ConsoleKit/Manager"),
+        UPower(bus, "/org/freedesktop/UPower"),
+        PolicyKit(bus, "/"),
+        Logind(bus, "/org/freedesktop/login1"),
+    ]
+    seat_objects = [ConsoleKitSeat(bus, "/org/freedesktop/ConsoleKit/Seat%d" % i) for i in range(seats)]
+    mock = Mock(bus, MOCK_PATH, seat_objects)
+
+    monitor = dbus.bus.BusConnection(address)
+    mock.ignore.add(bus.get_unique_name())
+    mock.ignore.add(monitor.get_unique_name())
+    monitor.add_message_filter(mock.count)
+    monitor.call_blocking("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus.Monitoring",
+                          "BecomeMonitor", "asu", (["type='method_call'"], 0))
+
+    GLib.MainLoop().run()
+
+class MockBus(object):
+
+    """ A private bus with the stand-in services, set as the system and session
+        bus of this process. XDG_RUNTIME_DIR is also pointed at a scratch
+        directory so the ability and authorization caches start empty """
+
+    def __init__(self, latency=0, seats=1, sessions=1, polkit="yes"):
+        self.latency = latency
+        self.seats = seats
+        self.sessions = sessions
+        self.polkit = polkit
+        self.daemon = None
+        self.services = None
+        self.environ = None
+
+    def start(self, timeout=10):
+        import dbus
+
+        self.tmp = tempfile.mkdtemp(prefix="oblogout-mockbus-")
+        self.daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+                                       stdout=subprocess.PIPE)
+        self.address = self.daemon.stdout.readline().decode().strip()
+        if not self.address:
+            self.stop()
+            raise RuntimeError("dbus-daemon failed to start")
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([SOURCE_DIR, os.environ.get("PYTHONPATH", "")]))
+        self.services = subprocess.Popen([sys.executable, "-m", "oblogout.mockbus", "--serve", self.address,
+                                          str(self.latency), str(self.seats), str(self.sessions), self.polkit],
+                                         env=env, cwd=SOURCE_DIR)
+
+        self.environ = dict((key, os.environ.get(key)) for key in
+                            ("DBUS_SYSTEM_BUS_ADDRESS", "DBUS_SESSION_BUS_ADDRESS", "XDG_RUNTIME_DIR"))
+        os.environ.update(DBUS_SYSTEM_BUS_ADDRESS=self.address, DBUS_SESSION_BUS_ADDRESS=self.address,
+                          XDG_RUNTIME_DIR=self.tmp)
+
+        self.control = dbus.bus.BusConnection(self.address)
+        deadline = time.monotonic() + timeout
+        while not self.control.name_has_owner(MOCK_NAME):
+            if time.monotonic() > deadline or self.services.poll() is not None:
+                self.stop()
+                raise RuntimeError("mock services failed to start")
+            time.sleep(0.05)
+
+    def reset(self):
+        """ Start counting round trips from zero """
+        self.control.call_blocking(MOCK_NAME, MOCK_PATH, MOCK_NAME, "Reset", "s", (self.control.get_unique_name(),))
+
+    def calls(self):
+        """ Method calls made since reset(), by interface and member """
+        return dict((str(key), int(value)) for key, value in
+                    self.control.call_blocking(MOCK_NAME, MOCK_PATH, MOCK_NAME, "Stats", "", ()).items())
+
+    def add_session(self, seat=0):
+        """ Add a session to a seat, announced with SessionAdded """
+        self.control.call_blocking(MOCK_NAME, MOCK_PATH, MOCK_NAME, "AddSession", "u", (seat,))
+
+    def stop(self):
+        for process in (self.services, self.daemon):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                process.wait()
+        self.services = self.daemon = None
+
+        if self.environ is not None:
+            for key, value in self.environ.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            self.environ = None
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+def run_until(condition, timeout=10):
+    """ Run the GLib main loop until condition() holds or timeout seconds
+        went by, returns condition() """
+
+    from gi.repository import GLib
+
+    if condition():
+        return True
+
+    loop = GLib.MainLoop()
+    deadline = time.monotonic() + timeout
+
+    def check():
+        if condition() or time.monotonic() > deadline:
+            loop.quit()
+            return False
+        return True
+
+    GLib.timeout_add(1, check)
+    loop.run()
+    return condition()
+
+def expected(backend, action, polkit):
+    """ (success, warm round trips) of an action once the controller is warm """
+
+    from .dbushandler import auth_retention
+
+    if action not in SUPPORTED[backend]:
+        return False, 0
+    if backend != "HAL":
+        return True, 1
+    if polkit == "yes":
+        return True, 1
+    if polkit.startswith("auth_"):
+        # IsProcessAuthorized and ObtainAuthorization again unless the grant is kept
+        return True, 1 if auth_retention(polkit) else 3
+    # The refusal is remembered, nothing is sent
+    return False, 0
+
+def benchmark(mock, repeat=5):
+    """ Time and count the round trips of the asynchronous DbusController paths
+        the dialog takes, per backend, checking each outcome. Returns the
+        results and a list of failed checks """
+
+    from .config import BACKENDS
+    from .dbushandler import DbusController, POLKIT_ACTIONS, SERVICES
+
+    failures = []
+
+    def measure(backend, name, operation, check, warm_trips):
+        """ operation() returns a condition to wait for, check(result) the failure or None """
+
+        timings = []
+        trips = []
+        result = None
+        try:
+            for i in range(repeat):
+                mock.reset()
+                start = time.perf_counter()
+                finished = operation()
+                if not run_until(finished):
+                    raise RuntimeError("no answer")
+                timings.append((time.perf_counter() - start) * 1000)
+                trips.append(mock.calls())
+                # The first failure is the one reported
+                result = result or check()
+        except Exception as ex:
+            failures.append("%s %s: %s" % (backend, name, ex))
+            return {'error': str(ex)}
+
+        entry = {
+            'first_ms': timings[0],
+            'warm_ms': min(timings[1:] or timings),
+            'round_trips': sum(trips[0].values()),
+            'warm_round_trips': sum(trips[-1].values()),
+            'calls': trips[0],
+        }
+        if result:
+            failures.append("%s %s: %s" % (backend, name, result))
+            entry['failed'] = result
+        elif warm_trips is not None and entry['warm_round_trips'] != warm_trips:
+            result = "%d warm round trips, expected %d: %s" % (entry['warm_round_trips'], warm_trips, trips[-1])
+            failures.append("%s %s: %s" % (backend, name, result))
+            entry['failed'] = result
+        return entry
+
+    results = {}
+    for backend in BACKENDS:
+        controller = DbusController(backend)
+        results[backend] = {}
+
+        # Ability answers come from the session cache once warm, only the services are asked for
+        probe = {}
+
+        def start_probe():
+            probe.clear()
+            probe['able'] = {}
+            controller.probe(ACTIONS, lambda action, able: probe['able'].__setitem__(action, able),
+                             lambda: probe.__setitem__('unavailable', True),
+                             on_finished=lambda: probe.__setitem__('finished', True))
+            return lambda: 'finished' in probe
+
+        def check_probe():
+            if 'unavailable' in probe:
+                return "backend reported unavailable"
+            refused = [action for action, able in probe['able'].items() if not able]
+            if refused:
+                return "abilities refused: %s" % ", ".join(refused)
+            return None
+
+        results[backend]['probe'] = measure(backend, "probe", start_probe, check_probe,
+                                            len(SERVICES[backend]))
+
+        # Proxies, the PolicyKit precheck and the session count
+        ids = [id for action in ACTIONS for id in POLKIT_ACTIONS.get(action, ())] if backend == "HAL" else []
+
+        def start_warm_up():
+            controller.warm_up(ACTIONS)
+            settled = lambda: all(controller.authorizations.get(id) or id in controller.requirements for id in ids)
+            if backend == "HAL":
+                return lambda: controller.sessions.ready and settled()
+            return lambda: True
+
+        # Nothing left to ask once warm
+        results[backend]['warm_up'] = measure(backend, "warm_up", start_warm_up, lambda: None, 0)
+
+        if backend == "HAL":
+            count = {}
+
+            def add_session():
+                count['before'] = controller.sessions.count()
+                mock.add_session()
+                return lambda: controller.sessions.count() == count['before'] + 1
+
+            # Kept current by SessionAdded alone, nothing is queried again
+            results[backend]['session_signal'] = measure(backend, "session_signal", add_session,
+                                                         lambda: None, 0)
+
+        for action in ACTIONS:
+            success, warm_trips = expected(backend, action, mock.polkit)
+            outcome = {}
+
+            def run_action(action=action, outcome=outcome):
+                outcome.clear()
+                getattr(controller, action)(lambda ok: outcome.__setitem__('ok', bool(ok)))
+                return lambda: 'ok' in outcome
+
+            def check_action(outcome=outcome, success=success):
+                if outcome['ok'] != success:
+                    return "succeeded" if outcome['ok'] else "failed"
+                return None
+
+            results[backend][action] = measure(backend, action, run_action, check_action, warm_trips)
+
+    return results, failures
+
+def main(argv):
+    latency = 5
+    seats = 8
+    sessions = 2
+    polkit = "yes"
+    repeat = 5
+    output = None
+
+    opts, args = getopt.getopt(argv[1:], "o:n:", ["output=", "repeat=", "latency=", "seats=", "sessions=",
+                                                  "polkit=", "serve"])
+    for o, a in opts:
+        if o == "--serve":
+            serve(args[0], int(args[1]), int(args[2]), int(args[3]), args[4])
+            return 0
+        elif o in ("-o", "--output"):
+            output = a
+        elif o in ("-n", "--repeat"):
+            repeat = int(a)
+        elif o == "--latency":
+            latency = int(a)
+        elif o == "--seats":
+            seats = int(a)
+        elif o == "--sessions":
+            sessions = int(a)
+        elif o == "--polkit":
+            polkit = a
+
+    mock = MockBus(latency, seats, sessions, polkit)
+    mock.start()
+    try:
+        backends, failures = benchmark(mock, repeat)
+        results = {
+            'meta': {'latency_ms': latency, 'seats': seats, 'sessions': sessions,
+                     'polkit': polkit, 'repeat': repeat},
+            'backends': backends,
+            'failures': failures,
+        }
+    finally:
+        mock.stop()
+
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+
+    for failure in failures:
+        sys.stderr.write("FAILED %s\n" % failure)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
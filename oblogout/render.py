@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Background rendering. The screen grab is uploaded once into a surface
+# similar to the window's and dimmed there by painting black over it, and
+# each redraw is a single paint of that surface
+# (or of the flat colour), limited to the clip region GTK hands to 'draw'.
+# When the fade runs in a thread, the thread dims into an image surface and
+# the main thread only copies it into the window's.
+
+import cairo
+
+from gi.repository import Gdk
+
+from .timing import measure
+
+# Rows processed at a time by render_strips()
+STRIP_HEIGHT = 128
+
+class Background(object):
+
+    """ Background paints the dialog backdrop, either a faded screen grab or
+        the configured colour at the configured opacity """
+
+    def __init__(self, bgcolor, opacity):
+        self.bgcolor = bgcolor
+        self.opacity = opacity
+        self.supports_alpha = False
+        # Set when the backdrop is a screen grab, drawn flat until it is ready
+        self.rendered = False
+        self.surface = None
+
+    def dim(self, cr, y, width, height):
+        """ Darken a band of cr to the configured opacity with one paint of
+            black, the same scaling as fade.fade_table without a pixel copy """
+
+        cr.set_operator(cairo.OPERATOR_OVER)
+        cr.set_source_rgba(0, 0, 0, 1.0 - min(self.opacity, 255) / 255.0)
+        cr.rectangle(0, y, width, height)
+        cr.fill()
+
+    def __convert(self, pixbuf, surface):
+        cr = cairo.Context(surface)
+        Gdk.cairo_set_source_pixbuf(cr, pixbuf, 0, 0)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.paint()
+        self.dim(cr, 0, pixbuf.get_width(), pixbuf.get_height())
+        surface.flush()
+        return surface
+
+    def dimmed_image(self, pixbuf):
+        """ Image surface of pixbuf dimmed to the configured opacity. It touches no
+            window, so it can be built off the main thread and given to set_image """
+
+        surface = cairo.ImageSurface(cairo.FORMAT_RGB24, pixbuf.get_width(), pixbuf.get_height())
+        return self.__convert(pixbuf, surface)
+
+    def set_pixbuf(self, pixbuf, window):
+        """ Convert pixbuf to a surface matching window and dim it, the pixbuf isn't
+            kept. Without a window the surface is an image surface, for benchmarks """
+
+        if window is None:
+            self.surface = self.dimmed_image(pixbuf)
+        else:
+            self.surface = self.__convert(pixbuf, window.create_similar_surface(
+                cairo.CONTENT_COLOR, pixbuf.get_width(), pixbuf.get_height()))
+
+    def set_image(self, image, window):
+        """ Use an image from dimmed_image, copied once into a surface matching
+            window so redraws don't upload it again. The image is released """
+
+        self.clear()
+        self.surface = window.create_similar_surface(cairo.CONTENT_COLOR, image.get_width(), image.get_height())
+        cr = cairo.Context(self.surface)
+        cr.set_source_surface(image, 0, 0)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.paint()
+        self.surface.flush()
+        image.finish()
+
+    def render_strips(self, window, rect, grab, process, strip=STRIP_HEIGHT):
+        """ Build the surface for window a strip at a time: grab(x, y, width, height)
+            returns a pixbuf of that part of the screen and process(pixbuf) applies the
+            effects, the strip is dimmed here. Apart from the surface, no buffer is
+            larger than a strip """
+
+        self.clear()
+        surface = window.create_similar_surface(cairo.CONTENT_COLOR, rect.width, rect.height)
+        cr = cairo.Context(surface)
+
+        for top in range(0, rect.height, strip):
+            height = min(strip, rect.height - top)
+            pixbuf = process(grab(rect.x, rect.y + top, rect.width, height))
+            Gdk.cairo_set_source_pixbuf(cr, pixbuf, 0, top)
+            cr.set_operator(cairo.OPERATOR_SOURCE)
+            cr.rectangle(0, top, rect.width, height)
+            cr.fill()
+            self.dim(cr, top, rect.width, height)
+            # Drop the strip before the next one is grabbed
+            cr.set_source_rgb(0, 0, 0)
+            del pixbuf
+
+        surface.flush()
+        self.surface = surface
+
+    def clear(self):
+        if self.surface is not None:
+            self.surface.finish()
+            self.surface = None
+
+    def draw(self, cr, x=0, y=0):
+        """ Paint the damaged area, cr comes clipped from the draw signal. x and y
+            give the window's offset into the grab, so every monitor shares it """
+
+        with measure("draw background"):
+            cr.set_operator(cairo.OPERATOR_SOURCE)
+
+            if self.surface is not None:
+                cr.set_source_surface(self.surface, -x, -y)
+            elif self.supports_alpha and not self.rendered:
+                cr.set_source_rgba(self.bgcolor.red, self.bgcolor.green, self.bgcolor.blue,
+                                   float(self.opacity)/100)
+            else:
+                # Without alpha, or standing in for the grab while it's being faded,
+                # the colour is blended over opaque black as it always was
+                a = float(self.opacity)/100
+                cr.set_source_rgb(self.bgcolor.red * a, self.bgcolor.green * a, self.bgcolor.blue * a)
+
+            cr.paint()
+            cr.set_operator(cairo.OPERATOR_OVER)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Per-user runtime files: the daemon socket and the D-Bus caches. They are
+# only kept in a directory the user owns and nobody else can enter, since
+# anyone can plant a file, a symlink or a socket in /tmp.
+
+import os
+import json
+import stat
+import tempfile
+
+def private_dir(path):
+    """ True if path is a real directory owned by the user and closed to others """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+def runtime_dir():
+    """ $XDG_RUNTIME_DIR, or a private oblogout-<uid> directory in the temporary
+        directory without one. None when neither can be trusted """
+
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime and private_dir(runtime):
+        return runtime
+
+    fallback = os.path.join(tempfile.gettempdir(), "oblogout-%d" % os.getuid())
+    try:
+        os.mkdir(fallback, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    # Someone else may have created it first
+    if not private_dir(fallback):
+        return None
+    return fallback
+
+def write_private(path, data):
+    """ Replace path with data as JSON through a fresh temporary file only the
+        user can read, never following a symlink """
+
+    tmp = "%s.%d" % (path, os.getpid())
+    try:
+        os.unlink(tmp)
+    except OSError:
+        pass
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Keyboard shortcuts. The [shortcuts] entries are compiled once into a dict
+# keyed by key strokes, so a key press is a single lookup.
+#
+# A stroke is a key name with optional modifiers, "Ctrl+Alt+Delete", and a
+# shortcut is one or more strokes separated by spaces, "S S" asking for a
+# double press. Letters match in either case.
+
+import logging
+
+from gi.repository import Gdk
+from gi.repository import Gtk
+
+MODIFIERS = {
+    'shift': Gdk.ModifierType.SHIFT_MASK,
+    'ctrl': Gdk.ModifierType.CONTROL_MASK,
+    'control': Gdk.ModifierType.CONTROL_MASK,
+    'alt': Gdk.ModifierType.MOD1_MASK,
+    'super': Gdk.ModifierType.SUPER_MASK,
+    'win': Gdk.ModifierType.SUPER_MASK,
+}
+
+KEY_ALIASES = {
+    'del': "Delete",
+    'esc': "Escape",
+    'enter': "Return",
+}
+
+# Pressing a modifier on its own sends a key press too, it must not break a
+# sequence, "Ctrl+Alt+Delete" arrives as Control_L, Alt_L then Delete
+MODIFIER_KEYS = frozenset(Gdk.keyval_from_name(name) for name in (
+    "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R",
+    "Meta_L", "Meta_R", "Super_L", "Super_R", "Hyper_L", "Hyper_R",
+    "ISO_Level3_Shift", "ISO_Level5_Shift", "Caps_Lock", "Num_Lock"))
+
+# The key a user holds for each modifier, to replay a shortcut
+MODIFIER_PRESSES = (
+    (Gdk.ModifierType.SHIFT_MASK, "Shift_L"),
+    (Gdk.ModifierType.CONTROL_MASK, "Control_L"),
+    (Gdk.ModifierType.MOD1_MASK, "Alt_L"),
+    (Gdk.ModifierType.SUPER_MASK, "Super_L"),
+)
+
+# Milliseconds allowed between the strokes of a sequence
+SEQUENCE_TIMEOUT = 1000
+
+def key_presses(sequence):
+    """ The (keyval, state) key presses typing a parsed shortcut sends, the
+        modifiers included, as GDK reports them """
+
+    presses = []
+    for keyval, mods in sequence:
+        held = 0
+        for mask, name in MODIFIER_PRESSES:
+            if mods & int(mask):
+                presses.append((Gdk.keyval_from_name(name), held))
+                held |= int(mask)
+        if mods & int(Gdk.ModifierType.SHIFT_MASK):
+            keyval = Gdk.keyval_to_upper(keyval)
+        presses.append((keyval, held))
+    return presses
+
+class ShortcutMap(object):
+
+    """ ShortcutMap resolves key presses to actions """
+
+    def __init__(self, shortcuts, timeout=SEQUENCE_TIMEOUT):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.timeout = timeout
+        self.mod_mask = int(Gtk.accelerator_get_default_mod_mask())
+        self.sequences = {}
+        self.prefixes = set()
+        self.pending = ()
+        self.last_time = 0
+
+        for action, spec in shortcuts:
+            sequence = self.parse(spec)
+            if sequence is None:
+                self.logger.warning("Invalid shortcut %s for %s, ignoring" % (spec, action))
+                continue
+            self.sequences[sequence] = action
+            for i in range(1, len(sequence)):
+                self.prefixes.add(sequence[:i])
+
+        for prefix in self.prefixes:
+            if prefix in self.sequences:
+                self.logger.warning("Shortcut for %s hides longer shortcuts starting with the same keys" % self.sequences[prefix])
+
+    def parse(self, spec):
+        """ Tuple of (keyval, modifiers) strokes for a shortcut, None if invalid """
+
+        sequence = []
+        for stroke in spec.split():
+            names = stroke.split("+")
+            # "Ctrl++" binds the plus key
+            if stroke.endswith("++"):
+                names = names[:-2] + ["plus"]
+
+            mods = 0
+            for name in names[:-1]:
+                if name.lower() not in MODIFIERS:
+                    return None
+                mods |= int(MODIFIERS[name.lower()])
+
+            key = names[-1]
+            keyval = Gdk.keyval_from_name(KEY_ALIASES.get(key.lower(), key))
+            if not keyval or keyval == Gdk.KEY_VoidSymbol:
+                return None
+            sequence.append((Gdk.keyval_to_lower(keyval), mods))
+
+        return tuple(sequence) or None
+
+    def __lookup(self, candidate):
+        if candidate in self.sequences:
+            self.pending = ()
+            return self.sequences[candidate]
+        if candidate in self.prefixes:
+            self.pending = candidate
+            return None
+        return False
+
+    def press(self, keyval, state, time=0):
+        """ Feed a key press, returns the action it completes or None """
+
+        # A modifier on its own is part of the next stroke, not a stroke. The
+        # is_modifier bit of the event isn't reachable from Python, the keysym is
+        if keyval in MODIFIER_KEYS:
+            return None
+
+        keyval = Gdk.keyval_to_lower(keyval)
+        mods = int(state) & self.mod_mask
+
+        # Shift is already part of the keyval for most keys, try without it too
+        strokes = [(keyval, mods)]
+        if mods & int(Gdk.ModifierType.SHIFT_MASK):
+            strokes.append((keyval, mods & ~int(Gdk.ModifierType.SHIFT_MASK)))
+
+        if self.pending and time - self.last_time > self.timeout:
+            self.pending = ()
+        self.last_time = time
+
+        for prefix in (self.pending, ()) if self.pending else ((),):
+            for stroke in strokes:
+                action = self.__lookup(prefix + (stroke,))
+                if action is not False:
+                    return action
+
+        self.pending = ()
+        return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Theme manifests. `oblogout --index-themes` writes an index.json next to the
+# icons of every theme, listing each icon's file, format, size and mtime, so
+# resolving a theme at start-up is one file read instead of probing for
+# <name>.svg and <name>.png per button. Themes without a manifest are still
+# probed. The manifest has to be regenerated when the icons are edited.
+
+import os
+import sys
+import json
+import logging
+
+MANIFEST = "index.json"
+MANIFEST_VERSION = 1
+
+# Preferred first when a theme has several files for a button
+FORMATS = ("svg", "png")
+
+logger = logging.getLogger("Themes")
+
+def theme_prefixes(local_mode=False):
+    """ Directories holding themes, the user's first """
+
+    if local_mode:
+        system = "./data/themes"
+    else:
+        system = "%s/share/themes" % sys.prefix
+    return ["~/.themes", system]
+
+def build_index(path):
+    """ Manifest for the theme icons in path """
+
+    from gi.repository import GdkPixbuf
+
+    icons = {}
+    for filename in sorted(os.listdir(path)):
+        name, ext = os.path.splitext(filename)
+        ext = ext[1:].lower()
+        if ext not in FORMATS:
+            continue
+        if name in icons and FORMATS.index(icons[name]['format']) <= FORMATS.index(ext):
+            continue
+
+        full = os.path.join(path, filename)
+        info, width, height = GdkPixbuf.Pixbuf.get_file_info(full)
+        if info is None:
+            logger.warning("%s is not a readable image, skipping" % full)
+            continue
+
+        icons[name] = {
+            'path': filename,
+            'format': ext,
+            'width': width,
+            'height': height,
+            'mtime_ns': os.stat(full).st_mtime_ns,
+        }
+
+    return {'version': MANIFEST_VERSION, 'icons': icons}
+
+def write_index(path):
+    """ Write the manifest of the theme in path, returns its filename """
+
+    manifest = os.path.join(path, MANIFEST)
+    tmp = "%s.%d" % (manifest, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(build_index(path), f, indent=1, sort_keys=True)
+    os.replace(tmp, manifest)
+    return manifest
+
+def read_index(path):
+    """ Icons listed by the manifest of the theme in path, with absolute
+        paths, or None when there is no usable manifest """
+
+    try:
+        with open(os.path.join(os.path.expanduser(path), MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        logger.warning("Ignoring theme manifest in %s, run oblogout --index-themes" % path)
+        return None
+
+    icons = manifest['icons']
+    for icon in icons.values():
+        icon['path'] = os.path.join(path, icon['path'])
+    return icons
+
+def probe_icons(path, names):
+    """ Icons for names found by looking for each file, the fallback without a manifest """
+
+    icons = {}
+    for name in names:
+        for ext in FORMATS:
+            full = os.path.join(path, "%s.%s" % (name, ext))
+            try:
+                mtime = os.stat(os.path.expanduser(full)).st_mtime_ns
+            except OSError:
+                continue
+            icons[name] = {'path': full, 'format': ext, 'mtime_ns': mtime}
+            break
+    return icons
+
+def index_themes(local_mode=False):
+    """ Write a manifest for every oblogout theme found, returns (written, failed) paths """
+
+    written = []
+    failed = []
+    for prefix in theme_prefixes(local_mode):
+        prefix = os.path.expanduser(prefix)
+        try:
+            themes = sorted(os.listdir(prefix))
+        except OSError:
+            continue
+
+        for theme in themes:
+            path = os.path.join(prefix, theme, "oblogout")
+            if not os.path.isdir(path):
+                continue
+            try:
+                written.append(write_index(path))
+            except OSError as ex:
+                logger.warning("Unable to index %s: %s" % (path, ex))
+                failed.append(path)
+
+    return written, failed
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+# Crunchbang Openbox Logout
+#   - GTK/Cairo based logout box styled for Crunchbang
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+# Start-up profiling and tracing. Phases are wrapped in measure() and points
+# in time recorded with mark(), both do nothing until enable() is called
+# (oblogout --profile-startup) or a trace file is set with --trace FILE or
+# $OBLOGOUT_TRACE. Traces are written at exit, as Chrome trace events or as
+# JSON lines when the file name ends in .jsonl.
+
+import os
+import sys
+import json
+import time
+import atexit
+
+# Trace timestamps are relative to the import of this module
+origin = time.perf_counter()
+origin_wallclock = time.time()
+
+enabled = False
+records = []
+marks = []
+trace_path = None
+_depth = 0
+
+class _Measure(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global _depth
+        self.depth = _depth
+        _depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _depth
+        _depth -= 1
+        records.append((self.name, self.depth, self.start, time.perf_counter()))
+        return False
+
+class _NoMeasure(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_nomeasure = _NoMeasure()
+
+def enable():
+    global enabled
+    enabled = True
+
+def enable_trace(path):
+    """ Record everything and write it to path when the process exits """
+
+    global trace_path
+    enable()
+    if trace_path is None:
+        atexit.register(flush)
+    trace_path = path
+
+def mark(name, **args):
+    """ Record an instant event """
+    if enabled:
+        marks.append((name, time.perf_counter(), args))
+
+def stamp(name, **args):
+    """ Record an instant event even while disabled, for the imports done before
+        the command line enables tracing. It is written if a trace is set later """
+    marks.append((name, time.perf_counter(), args))
+
+def measure(name):
+    """ Context manager timing the wrapped block under name """
+    if enabled:
+        return _Measure(name)
+    return _nomeasure
+
+def report(stream=None):
+    """ Print each measured phase with its own and cumulative time in ms,
+        nested phases are indented and already counted in their parent """
+
+    stream = stream or sys.stderr
+    total = 0.0
+    stream.write("%-40s %10s %10s\n" % ("phase", "ms", "cumulative"))
+    for name, depth, start, end in sorted(records, key=lambda r: r[2]):
+        elapsed = (end - start) * 1000
+        if depth == 0:
+            total += elapsed
+        stream.write("%-40s %10.1f %10.1f\n" % ("  " * depth + name, elapsed, total))
+
+def trace_memory():
+    """ Start tracing Python allocations while profiling or tracing, returns
+        whether it was started. tracemalloc slows every allocation, so it only
+        runs around the measured work and is stopped with untrace_memory() """
+
+    if not enabled:
+        return False
+    import tracemalloc
+    tracemalloc.start()
+    return True
+
+def untrace_memory():
+    import tracemalloc
+    tracemalloc.stop()
+
+def memory_usage(reset_peak=False):
+    """ Resident set size and its peak in KB, plus current and peak Python
+        allocations when tracemalloc is running (see trace_memory). Pixel
+        buffers are allocated by GLib and cairo, only the RSS accounts for them """
+
+    import resource
+    import tracemalloc
+
+    usage = {'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    try:
+        with open("/proc/self/statm") as f:
+            usage['rss_kb'] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        usage['rss_kb'] = 0
+
+    if tracemalloc.is_tracing():
+        usage['traced_kb'], usage['traced_peak_kb'] = [n // 1024 for n in tracemalloc.get_traced_memory()]
+        if reset_peak:
+            tracemalloc.reset_peak()
+    return usage
+
+def trace_events():
+    """ Chrome trace-event objects for the recorded spans and marks """
+
+    pid = os.getpid()
+    events = [{'name': name, 'cat': "oblogout", 'ph': "X", 'pid': pid, 'tid': 1,
+               'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6, 'args': {'depth': depth}}
+              for name, depth, start, end in records]
+    events += [{'name': name, 'cat': "oblogout", 'ph': "i", 's': "p", 'pid': pid, 'tid': 1,
+                'ts': (t - origin) * 1e6, 'args': args}
+               for name, t, args in marks]
+    events.sort(key=lambda e: e['ts'])
+    return events
+
+def flush():
+    """ Write the trace file, if tracing """
+
+    if trace_path is None:
+        return
+
+    events = trace_events()
+    try:
+        with open(trace_path, "w") as f:
+            if trace_path.endswith(".jsonl"):
+                f.write(json.dumps({'type': "process", 'pid': os.getpid(), 'start_time': origin_wallclock}) + "\n")
+                for event in events:
+                    line = {'type': "span" if event['ph'] == "X" else "mark",
+                            'name': event['name'], 'time_ms': event['ts'] / 1000.0, 'args': event['args']}
+                    if 'dur' in event:
+                        line['duration_ms'] = event['dur'] / 1000.0
+                    f.write(json.dumps(line) + "\n")
+            else:
+                json.dump({'traceEvents': events, 'displayTimeUnit': "ms",
+                           'otherData': {'start_time': origin_wallclock}}, f)
+    except OSError as ex:
+        sys.stderr.write("Unable to write trace %s: %s\n" % (trace_path, ex))
+
+if os.environ.get("OBLOGOUT_TRACE"):
+    enable_trace(os.environ["OBLOGOUT_TRACE"])
@@ -13,6 +13,7 @@ setup(name = "oblogout",
     url = "http://launchpad.net/oblogout/",
 
     packages = ['oblogout'],
+    package_data = {'oblogout': ['dialog.ui', 'dialog.css']},
     scripts = ["data/oblogout"],
     data_files = [('share/themes/foom/oblogout', glob.glob('data/themes/foom/oblogout/*')),
                  ('share/themes/oxygen/oblogout', glob.glob('data/themes/oxygen/oblogout/*')),